@@ -1,77 +1,51 @@
 import os
 import subprocess
-import faiss
-from sentence_transformers import SentenceTransformer
-from datetime import datetime
-
-DATA_DIR = "college_data"
-MEMORY_FILE = "memory.txt"
-LLAMA_RUN = "llama.cpp/build/bin/llama-run"
+from retrieval import get_retriever, format_context, ADAPTIVE_MAX_K
+from intent_router import IntentRouter
+from structured_lookup import StructuredLookup
+from faq_bank import FaqBank
+from chat_log import ChatLogWriter
+from llm import run_llm_process, generation_options, CANCELLED
+from extractive import ExtractiveAnswerer
+from conversation import ConversationStore, summary_options
+
+LLAMA_RUN = os.environ.get("LLAMA_RUN", "llama.cpp/build/bin/llama-run")
 MODEL_PATH = "models/Llama-3.2-3B-Instruct-Q4_K_M.gguf"
-EMBED_MODEL_PATH = "./embedding_models/all-MiniLM-L6-v2"
-MAX_TOKENS = 200
-HISTORY_DEPTH = 1
-
-def load_documents(path=DATA_DIR):
-    docs = []
-    for root, _, files in os.walk(path):
-        for file in files:
-            if file.endswith(".txt"):
-                with open(os.path.join(root, file), 'r', encoding='utf-8', errors='ignore') as f:
-                    text = f.read()
-                    chunks = text.split("\n\n")
-                    docs.extend([chunk.strip() for chunk in chunks if chunk.strip()])
-    return docs
-
-def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f if line.strip()]
-    return []
-
-def save_memory_line(line):
-    with open(MEMORY_FILE, "a", encoding="utf-8") as f:
-        f.write(line.strip() + "\n")
-
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
-print("[INFO] Loading embedding model...")
-embed_model = SentenceTransformer(EMBED_MODEL_PATH)
-
-print("[INFO] Loading documents...")
-documents = load_documents() + load_memory()
-print(f"[INFO] Loaded {len(documents)} chunks.")
-
-print("[INFO] Embedding and indexing...")
-embeddings = embed_model.encode(documents, normalize_embeddings=True)
-index = faiss.IndexFlatIP(embeddings.shape[1])
-index.add(embeddings)
-
-def retrieve_context(query, k=3):
-    query_vec = embed_model.encode([query], normalize_embeddings=True)
-    D, I = index.search(query_vec, k)
-    return "\n---\n".join([documents[i] for i in I[0]])
-
-def ask_llama(prompt):
-    result = subprocess.run(
-        [LLAMA_RUN, MODEL_PATH, prompt, f"--n-predict={MAX_TOKENS}"],
-        capture_output=True
-    )
-    return result.stdout.decode("utf-8").strip()
-
-chat_history = []
-
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-chat_file_path = f"chats/chat_{timestamp}.txt"
-
-def log_chat_to_file(user, bot):
-    with open(chat_file_path, "a", encoding="utf-8") as f:
-        f.write(f"User: {user}\nBot: {bot}\n\n")
-
-def format_history():
-    return "\n".join([
-        f"User: {turn['user']}\nBot: {turn['bot']}"
-        for turn in chat_history[-HISTORY_DEPTH:]
-    ])
+LLAMA_TIMEOUT = 120
+LLAMA_FIRST_OUTPUT_TIMEOUT = float(os.environ.get("LLAMA_FIRST_OUTPUT_TIMEOUT", "30"))   # llama-run loads the model and reads the prompt before its first token
+SESSION = "local"
+
+retriever = get_retriever()
+
+router = IntentRouter(retriever.encode, retriever.remember, handlers=[StructuredLookup(), FaqBank(retriever.encode)])
+
+def retrieve_context(query, max_k=ADAPTIVE_MAX_K, query_vec=None):
+    return retriever.retrieve_adaptive(query, max_k, query_vec)
+
+# Answers from the retrieved chunks when llama.cpp fails or times out
+extractive = ExtractiveAnswerer(retriever.encode)
+
+# Returns None when llama.cpp failed; the caller falls back to an extractive answer.
+# CANCELLED means Ctrl+C: the turn is dropped.
+
+def ask_llama(prompt, options=None):
+    options = options or generation_options()
+    try:
+        result = run_llm_process([LLAMA_RUN, MODEL_PATH, prompt, f"--n-predict={options['max_tokens']}"],
+                                 timeout=LLAMA_TIMEOUT, options=options, first_timeout=LLAMA_FIRST_OUTPUT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        print("[ERROR] llama.cpp call timed out.")
+        return None
+    except KeyboardInterrupt:
+        return CANCELLED
+    return result.stdout.decode("utf-8").strip() or None
+
+# Recent turns verbatim, older ones summarized by llama.cpp while you type the next question
+conversation = ConversationStore(lambda prompt: ask_llama(prompt, summary_options()))
+chat_log = ChatLogWriter()
+
+def log_chat_to_file(user, bot, **fields):
+    chat_log.log(user, bot, **fields)
 
 def build_prompt(query, context):
     return f"""You are a helpful college assistant at Graphic Era Hill University, Bhimtal Campus.
@@ -87,7 +61,7 @@ You are AlphaMind
 - Do not make up information.
 
 Conversation History:
-{format_history()}
+{conversation.history(SESSION)}
 
 Context:
 {context}
@@ -101,19 +75,25 @@ while True:
     if query.lower() == "exit":
         break
 
-    if query.lower().startswith(("remember that", "learn that")):
-        fact = query.partition("that")[2].strip()
-        if fact:
-            save_memory_line(fact)
-            print(f"\nAlphaMind: Got it! I’ll remember: {fact}")
-        else:
-            print("\nPlease provide a fact after 'remember that'")
+    query_vec = retriever.encode([query])
+    route = router.route(query, query_vec)
+    if route.reply is not None:
+        print(f"\nAlphaMind: {route.reply}")
+        log_chat_to_file(query, route.reply, intent=route.intent)
         continue
 
-    context = retrieve_context(query)
-    prompt = build_prompt(query, context)
-    answer = ask_llama(prompt)
+    hits = retrieve_context(query, query_vec=query_vec)
+    prompt = build_prompt(query, format_context(hits))
+    answer = ask_llama(prompt, generation_options(query))
+    if answer is CANCELLED:
+        print("\n[Cancelled] Generation stopped.")
+        continue
+    fallback = "error" if answer is None else None
+    if fallback:
+        answer = extractive.answer(query_vec, hits, fallback)
+        print("\n⚡ Quick answer from the college documents:")
+    else:
+        conversation.add(SESSION, query, answer)
 
     print(f"\n🤖 CollegeBot: {answer}")
-    chat_history.append({"user": query, "bot": answer})
-    log_chat_to_file(query, answer)
\ No newline at end of file
+    log_chat_to_file(query, answer, chunk_ids=[hit["id"] for hit in hits], k=len(hits), fallback=fallback)
\ No newline at end of file
@@ -0,0 +1,307 @@
+import os
+import time
+import queue
+import threading
+from urllib.parse import urlsplit
+import requests
+import metrics
+from llm import stream_ollama, cancellable_session, generation_options, OLLAMA_URL, MODEL_NAME
+
+# ---------------- Config ----------------
+# Comma-separated Ollama generate URLs, e.g.
+#   OLLAMA_URLS=http://node1:11434/api/generate,http://node2:11434/api/generate
+OLLAMA_URLS = [url.strip() for url in os.environ.get("OLLAMA_URLS", OLLAMA_URL).split(",") if url.strip()]
+HEALTH_INTERVAL = 10     # seconds between health probes
+HEALTH_TIMEOUT = 2
+FAILURE_THRESHOLD = 3    # consecutive failures (connection errors, 5xx, broken streams) that open a circuit
+COOLDOWN = 30            # seconds an open circuit stays open before one trial request
+# Start a second copy of a request on another node when the first has not
+# produced a token after this many ms (0 disables hedging).
+HEDGE_AFTER_MS = int(os.environ.get("OLLAMA_HEDGE_MS", "0"))
+POLL_INTERVAL = 0.1
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        parts = urlsplit(url)
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        self.name = parts.netloc
+        self.outstanding = 0
+        self.background = 0      # of outstanding, how many are background generations
+        self.failures = 0
+        self.tripped = False     # circuit opened and not yet closed by a successful trial
+        self.trial = False       # the half-open trial request is in flight
+        self.open_until = 0.0
+        self.healthy = True
+
+    def circuit(self, now):
+        if not self.tripped:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+    def available(self, now):
+        circuit = self.circuit(now)
+        return self.healthy and (circuit == "closed" or (circuit == "half-open" and not self.trial))
+
+    def status(self):
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "background": self.background,
+            "failures": self.failures,
+            "healthy": self.healthy,
+            "circuit": self.circuit(time.monotonic()),
+        }
+
+
+# Spreads generations over several Ollama nodes. Each request goes to the
+# available node with the fewest requests in flight, taking turns among
+# equally loaded ones. Nodes that fail their health probe, or fail
+# FAILURE_THRESHOLD requests in a row, are skipped until they recover: once
+# COOLDOWN has passed the circuit is half-open and lets a single trial
+# request through, which closes it on success and reopens it on failure.
+# 4xx answers (unknown model, bad request) and cancellations are not node
+# failures. With hedge_after set, a request that
+# has not produced its first token in time is duplicated on a second node
+# and whichever answers first wins; the other is cancelled.
+#
+# Background generations (conversation summaries, which nobody waits for) only
+# start while no foreground request is in flight, give way to the next one by
+# being cancelled and retried once the pool is idle again, and are left out of
+# outstanding(), so they never hold a slot a user is waiting for or make the
+# pool look saturated.
+class BackendPool:
+    def __init__(self, urls=None, health_interval=HEALTH_INTERVAL, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=COOLDOWN, hedge_after=HEDGE_AFTER_MS / 1000):
+        self.endpoints = [Endpoint(url) for url in (urls or OLLAMA_URLS)]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_after = hedge_after
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.turn = 0
+        self.foreground = 0          # foreground requests in flight
+        self.yielding = set()        # preempt events of running background generations
+        if health_interval:
+            self.health_interval = health_interval
+            threading.Thread(target=self.probe_loop, daemon=True).start()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = cancellable_session()
+        return self.local.session
+
+    # ---------------- Routing ----------------
+    def acquire(self, exclude=(), background=False):
+        now = time.monotonic()
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            available = [e for e in candidates if e.available(now)]
+            if available:
+                least = min(e.outstanding for e in available)
+                tied = [e for e in available if e.outstanding == least]
+                endpoint = tied[self.turn % len(tied)]
+                self.turn += 1
+            else:
+                # Everything is down, open or busy with its trial request: try the
+                # node that will recover first rather than refusing outright.
+                endpoint = min(candidates, key=lambda e: (not e.healthy, e.trial, e.open_until))
+            if endpoint.circuit(now) == "half-open":
+                endpoint.trial = True
+            endpoint.outstanding += 1
+            endpoint.background += background
+        metrics.incr(f"backend.{endpoint.name}.requests")
+        return endpoint
+
+    def release(self, endpoint, ok, background=False):
+        with self.lock:
+            endpoint.outstanding -= 1
+            endpoint.background -= background
+            endpoint.trial = False
+            if ok is None:
+                return
+            if ok:
+                if endpoint.tripped:
+                    print(f"[INFO] {endpoint.url} answered its trial request; using it again")
+                endpoint.failures = 0
+                endpoint.tripped = False
+                endpoint.open_until = 0.0
+                return
+            endpoint.failures += 1
+            metrics.incr(f"backend.{endpoint.name}.failures")
+            if endpoint.failures >= self.failure_threshold:
+                endpoint.tripped = True
+                endpoint.open_until = time.monotonic() + self.cooldown
+                metrics.incr(f"backend.{endpoint.name}.circuit_open")
+                print(f"[WARN] {endpoint.url} failed {endpoint.failures} times; skipping it for {self.cooldown}s")
+
+    def stream_from(self, endpoint, prompt, model, cancel, options, background=False):
+        ok = None
+        try:
+            yield from stream_ollama(prompt, session=self.session(), model=model, url=endpoint.url, cancel=cancel,
+                                     options=options)
+            # A cancelled request says nothing about the node's health.
+            ok = None if cancel is not None and cancel.is_set() else True
+        except requests.HTTPError as e:
+            # The node is up and answered; the request itself was refused.
+            ok = None if e.response is not None and e.response.status_code < 500 else False
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.release(endpoint, ok, background)
+
+    # ---------------- Generation ----------------
+    def stream(self, prompt, model=MODEL_NAME, cancel=None, options=None):
+        with self.lock:
+            self.foreground += 1
+            for preempt in self.yielding:
+                preempt.set()
+        try:
+            yield from self.stream_foreground(prompt, model, cancel, options or generation_options())
+        finally:
+            with self.lock:
+                self.foreground -= 1
+
+    def stream_foreground(self, prompt, model, cancel, options):
+        if self.hedge_after and len(self.endpoints) > 1:
+            yield from self.stream_hedged(prompt, model, cancel, options)
+            return
+        yield from self.stream_failover(prompt, model, cancel, options)
+
+    def stream_failover(self, prompt, model, cancel, options, background=False):
+        tried = []
+        while True:
+            endpoint = self.acquire(exclude=tried, background=background)
+            tried.append(endpoint)
+            started = False
+            try:
+                for chunk in self.stream_from(endpoint, prompt, model, cancel, options, background):
+                    started = True
+                    yield chunk
+                return
+            except Exception:
+                # Fail over to another node only if nothing was sent yet.
+                if started or len(tried) == len(self.endpoints):
+                    raise
+                metrics.incr("backend.failover")
+
+    def generate(self, prompt, model=MODEL_NAME, cancel=None, options=None):
+        return "".join(self.stream(prompt, model, cancel, options)).strip()
+
+    # Like generate(), for work nobody is waiting on: waits for an idle pool
+    # and starts over whenever a foreground request preempts it.
+    def generate_background(self, prompt, model=MODEL_NAME, options=None):
+        options = options or generation_options()
+        while True:
+            preempt = threading.Event()
+            with self.lock:
+                idle = self.foreground == 0
+                if idle:
+                    self.yielding.add(preempt)
+            if not idle:
+                time.sleep(POLL_INTERVAL)
+                continue
+            try:
+                text = "".join(self.stream_failover(prompt, model, preempt, options, background=True))
+            finally:
+                with self.lock:
+                    self.yielding.discard(preempt)
+            if not preempt.is_set():
+                return text.strip()
+            metrics.incr("backend.background_preempted")
+
+    def stream_hedged(self, prompt, model, cancel, options):
+        results = queue.Queue()
+        used, stops = [], []
+
+        def attempt(endpoint):
+            number, stop = len(stops), threading.Event()
+            used.append(endpoint)
+            stops.append(stop)
+
+            def run():
+                try:
+                    for chunk in self.stream_from(endpoint, prompt, model, stop, options):
+                        results.put((number, "chunk", chunk))
+                    results.put((number, "done", None))
+                except Exception as e:
+                    results.put((number, "error", e))
+            threading.Thread(target=run, daemon=True).start()
+
+        attempt(self.acquire())
+        winner, running = None, 1
+        hedge_at = time.monotonic() + self.hedge_after
+        try:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return
+                try:
+                    number, kind, value = results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if winner is None and len(stops) == 1 and time.monotonic() >= hedge_at:
+                        backup = self.acquire(exclude=used)
+                        if backup is not None:
+                            attempt(backup)
+                            running += 1
+                            metrics.incr("backend.hedged")
+                    continue
+                if kind == "error":
+                    if number == winner:
+                        raise value
+                    running -= 1
+                    if winner is None and running == 0:
+                        backup = self.acquire(exclude=used)
+                        if backup is None:
+                            raise value
+                        attempt(backup)
+                        running += 1
+                        metrics.incr("backend.failover")
+                    continue
+                if winner is None:
+                    # First node to answer wins; the others are cancelled.
+                    winner = number
+                    for other, stop in enumerate(stops):
+                        if other != winner:
+                            stop.set()
+                    if winner > 0:
+                        metrics.incr("backend.hedge_won")
+                if number != winner:
+                    continue
+                if kind == "done":
+                    return
+                yield value
+        finally:
+            for stop in stops:
+                stop.set()
+
+    # ---------------- Health ----------------
+    def probe(self, endpoint):
+        try:
+            response = self.session().get(f"{endpoint.base_url}/api/tags", timeout=HEALTH_TIMEOUT)
+            healthy = response.ok
+        except requests.RequestException:
+            healthy = False
+        if healthy != endpoint.healthy:
+            print(f"[INFO] {endpoint.url} is {'back up' if healthy else 'down'}")
+        endpoint.healthy = healthy
+
+    def probe_loop(self):
+        while True:
+            for endpoint in self.endpoints:
+                self.probe(endpoint)
+            time.sleep(self.health_interval)
+
+    # Foreground requests in flight per node, summed; background ones give way
+    # to them, so they do not count.
+    def outstanding(self):
+        with self.lock:
+            return sum(endpoint.outstanding - endpoint.background for endpoint in self.endpoints)
+
+    def status(self):
+        with self.lock:
+            return [endpoint.status() for endpoint in self.endpoints]
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from retrieval import get_retriever, format_context
+from llm import query_ollama, OLLAMA_URL, MODEL_NAME
+from prompts import build_prompt
+
+# Offline batch answering:
+#   python batch_answer.py faq.jsonl answers.jsonl --workers 4
+#
+# Reads one JSON object per line, retrieves context for whole batches of
+# questions at once, fans generation out over a pool of Ollama connections
+# and appends one result line per question. Re-running with the same output
+# file skips questions that already have an "ok" result, so an interrupted
+# run resumes where it stopped.
+
+ID_FIELDS = ("id", "request_id")
+QUESTION_FIELDS = ("question", "message", "title")
+
+
+def pick(record, fields):
+    for field in fields:
+        if record.get(field):
+            return record[field]
+    return None
+
+
+def load_questions(path, id_field=None, question_field=None):
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            item_id = record.get(id_field) if id_field else pick(record, ID_FIELDS)
+            question = record.get(question_field) if question_field else pick(record, QUESTION_FIELDS)
+            if not question:
+                print(f"[WARN] Line {line_no}: no question field, skipped")
+                continue
+            items.append({"id": str(item_id if item_id is not None else line_no), "question": question})
+    return items
+
+
+def load_done(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if result.get("status") == "ok":
+                    done.add(result["id"])
+    return done
+
+
+# One keep-alive session per worker thread; workers are spread round-robin
+# over the configured Ollama endpoints.
+class ConnectionPool:
+    def __init__(self, urls):
+        self.urls = urls
+        self.local = threading.local()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not hasattr(self.local, "session"):
+            with self.lock:
+                self.local.url = self.urls[self.count % len(self.urls)]
+                self.count += 1
+            self.local.session = requests.Session()
+        return self.local.session, self.local.url
+
+
+def generate(pool, item, model):
+    session, url = pool.get()
+    start = time.perf_counter()
+    try:
+        answer = query_ollama(build_prompt(item["question"], format_context(item["hits"])),
+                              session=session, model=model, url=url)
+        status, error = "ok", None
+    except Exception as e:
+        answer, status, error = None, "error", str(e)
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": answer,
+        "status": status,
+        "error": error,
+        "chunk_ids": [hit["id"] for hit in item["hits"]],
+        "retrieval_ms": item["retrieval_ms"],
+        "generation_ms": round((time.perf_counter() - start) * 1000, 1),
+        "endpoint": url,
+    }
+
+
+def run(args):
+    items = load_questions(args.input, args.id_field, args.question_field)
+    done = load_done(args.output)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"[INFO] {len(items)} questions, {len(done)} already answered, {len(pending)} to go.")
+    if not pending:
+        return
+
+    retriever = get_retriever()
+    pool = ConnectionPool(args.url or [OLLAMA_URL])
+    finished = failed = 0
+    run_start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            for start in range(0, len(pending), args.batch_size):
+                batch = pending[start:start + args.batch_size]
+                retrieval_start = time.perf_counter()
+                hits = retriever.retrieve_batch([item["question"] for item in batch], args.k, args.batch_size)
+                retrieval_ms = round((time.perf_counter() - retrieval_start) * 1000 / len(batch), 2)
+                for item, item_hits in zip(batch, hits):
+                    item["hits"], item["retrieval_ms"] = item_hits, retrieval_ms
+
+                futures = [executor.submit(generate, pool, item, args.model) for item in batch]
+                for future in as_completed(futures):
+                    result = future.result()
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+                    finished += 1
+                    failed += result["status"] != "ok"
+                elapsed = time.perf_counter() - run_start
+                print(f"[INFO] {finished}/{len(pending)} done, {failed} failed, {finished / elapsed:.2f} q/s")
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrupted; re-run the same command to resume.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions offline.")
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("output", help="JSONL results file (appended to; used for resume)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent generation requests")
+    parser.add_argument("--batch-size", type=int, default=32, help="questions retrieved per batch")
+    parser.add_argument("--k", type=int, default=3, help="chunks retrieved per question")
+    parser.add_argument("--url", action="append", help="Ollama generate URL; repeat for several endpoints")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--id-field", help=f"id field (default: first of {', '.join(ID_FIELDS)}, else line number)")
+    parser.add_argument("--question-field", help=f"question field (default: first of {', '.join(QUESTION_FIELDS)})")
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
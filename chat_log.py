@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+# ---------------- Config ----------------
+LOG_DIR = "chats"
+QUEUE_SIZE = 1000
+BATCH_SIZE = 64
+FLUSH_INTERVAL = 1.0
+MAX_BYTES = 5 * 1024 * 1024
+ROTATE_INTERVAL = 24 * 60 * 60
+
+_STOP = object()
+
+
+# Request threads only enqueue; a single writer thread batches records into
+# chats/chat_<timestamp>_<pid>.jsonl and rotates by size and age. When the
+# queue is full the record is dropped (and counted) rather than blocking a reply.
+class ChatLogWriter:
+    def __init__(self, log_dir=LOG_DIR, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_bytes=MAX_BYTES, rotate_interval=ROTATE_INTERVAL):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.opened_at = 0.0
+        self.size = 0
+        os.makedirs(log_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name="chat-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, user, bot, **fields):
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "user": user, "bot": bot, **fields}
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self.write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        self.write(batch)
+        if self.file:
+            self.file.close()
+
+    def write(self, batch):
+        if not batch:
+            return
+        try:
+            if self.file is None or self.size >= self.max_bytes or time.time() - self.opened_at >= self.rotate_interval:
+                self.rotate()
+            data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch).encode("utf-8")
+            self.file.write(data)
+            self.file.flush()
+            self.size += len(data)
+        except OSError as e:
+            print(f"[ERROR] Chat log write failed, {len(batch)} records lost: {e}")
+
+    def rotate(self):
+        if self.file:
+            self.file.close()
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        base = os.path.join(self.log_dir, f"chat_{timestamp}_{os.getpid()}")
+        self.path = base + ".jsonl"
+        suffix = 1
+        while os.path.exists(self.path):
+            self.path = f"{base}-{suffix}.jsonl"
+            suffix += 1
+        self.file = open(self.path, "ab")
+        self.opened_at = time.time()
+        self.size = self.file.tell()
+
+    def close(self, timeout=5.0):
+        if not self.thread.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("[WARN] Chat log queue still full at shutdown")
+            return
+        self.thread.join(timeout)
+        if self.dropped:
+            print(f"[WARN] Chat log dropped {self.dropped} records under load")
@@ -1,60 +1,100 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 from googletrans import Translator
-from sentence_transformers import SentenceTransformer
-from datetime import datetime
-import faiss
-import requests
+from functools import lru_cache
+import threading
+import hashlib
+import math
+import json
+import time
+import uuid
+import sys
 import os
 
+# The retrieval module and its prebuilt index live at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval import get_retriever, format_context, ADAPTIVE_MAX_K
+from chat_log import ChatLogWriter
+from intent_router import IntentRouter, normalize
+from structured_lookup import StructuredLookup
+from faq_bank import FaqBank
+from backend_pool import BackendPool
+from model_router import ModelRouter
+from llm import generation_options, SentenceBuffer, DETAILED_MAX_TOKENS
+from extractive import ExtractiveAnswerer
+from single_flight import SingleFlight
+from tenants import TenantRegistry, ALL_TENANTS
+from conversation import ConversationStore, summary_options
+from prompts import build_prompt
+import metrics
+
 app = Flask(__name__)
+sock = Sock(app)
 translator = Translator()
 
 # ---------------- Config ----------------
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "llama3.2"
-DATA_DIR = "college_data"
-MEMORY_FILE = "memory.txt"
-EMBED_MODEL_PATH = "./embedding_models/all-MiniLM-L6-v2"
-HISTORY_DEPTH = 1
+CHAT_TIMEOUT = 60      # seconds a /chat request waits for generation
+MAX_CHAT_TIMEOUT = 120
+# Latency SLO: when generation has not started after FIRST_TOKEN_DEADLINE
+# seconds, or every node already has MAX_QUEUED_PER_NODE requests in flight,
+# answer at once with sentences extracted from the retrieved chunks.
+FIRST_TOKEN_DEADLINE = float(os.environ.get("FIRST_TOKEN_DEADLINE", "8"))
+MAX_QUEUED_PER_NODE = int(os.environ.get("MAX_QUEUED_PER_NODE", "4"))
 
 # ---------------- Chat History Setup ----------------
-chat_history = []
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-os.makedirs("chats", exist_ok=True)
-chat_file_path = f"chats/chat_{timestamp}.txt"
-
-def format_history():
-    return "\n".join([
-        f"User: {turn['user']}\nBot: {turn['bot']}"
-        for turn in chat_history[-HISTORY_DEPTH:]
-    ])
-
-def log_chat_to_file(user, bot):
-    with open(chat_file_path, "a", encoding="utf-8") as f:
-        f.write(f"User: {user}\nBot: {bot}\n\n")
-
-# ---------------- Load Documents ----------------
-def load_documents():
-    docs = []
-    for root, _, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith(".txt"):
-                with open(os.path.join(root, file), "r", encoding="utf-8", errors="ignore") as f:
-                    for chunk in f.read().split("\n\n"):
-                        if chunk.strip():
-                            docs.append(chunk.strip())
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            docs += [line.strip() for line in f if line.strip()]
-    return docs
-
-print("[INFO] Loading embedding model and data...")
-embed_model = SentenceTransformer(EMBED_MODEL_PATH)
-documents = load_documents()
-embeddings = embed_model.encode(documents, normalize_embeddings=True)
-index = faiss.IndexFlatIP(embeddings.shape[1])
-index.add(embeddings)
-print(f"[INFO] {len(documents)} context documents loaded.")
+chat_log = ChatLogWriter()
+
+def log_chat_to_file(user, bot, **fields):
+    chat_log.log(user, bot, **fields)
+
+# ---------------- Retrieval ----------------
+retriever = get_retriever()
+# No remember callback: "remember that ..." would let any anonymous client add
+# facts to the shared index, so memory stays a local CLI/Gradio feature.
+router = IntentRouter(retriever.encode, handlers=[StructuredLookup(), FaqBank(retriever.encode)])
+
+# Requests with a "tenant" field search that campus's own index (or several,
+# or "*" for all of them) instead of the merged default one. Tenant indexes
+# load on first use and share the embedding model. The table lookups, FAQ
+# bank and memory belong to the default index, so tenant requests only get
+# the small-talk fast path.
+tenants = TenantRegistry(retriever)
+tenant_router = IntentRouter(retriever.encode)
+
+# ---------------- Request Coalescing ----------------
+# Identical questions that arrive while one is being generated (everyone
+# asking about hostel fees at once) share a single Ollama generation.
+# Generation is always in English, so Hindi and English askers share too;
+# translation happens per request afterwards.
+coalescer = SingleFlight()
+
+# Ollama nodes from OLLAMA_URLS (comma-separated), default the local one
+backends = BackendPool()
+models = ModelRouter()
+extractive = ExtractiveAnswerer(retriever.encode)
+
+# Per-session history: the last few turns verbatim plus a summary of the
+# older ones, written by the small model in the background after replying.
+# Summaries only run while no chat request is generating and stop as soon as
+# one starts, so they never delay a first token or count towards saturation.
+conversations = ConversationStore(
+    lambda prompt: backends.generate_background(prompt, models.model("small") or models.model("large"),
+                                                options=summary_options()))
+
+def saturated(key):
+    # Joining a generation that is already running adds no load
+    return (backends.outstanding() >= MAX_QUEUED_PER_NODE * len(backends.endpoints)
+            and not coalescer.in_flight(key))
+
+# Everything the prompt and the generation depend on. The session's history
+# is part of the prompt, so only requests with the same history (in practice:
+# first questions, which have none) share a generation; a reply never carries
+# another user's conversation.
+def coalesce_key(query, hits, history, model, options):
+    history_hash = hashlib.sha256(history.encode("utf-8")).hexdigest() if history else ""
+    return (normalize(query), tuple(hit["id"] for hit in hits), history_hash, model,
+            options["max_tokens"], options["max_sentences"])
 
 # ---------------- Helper Functions ----------------
 def translate_to_english(text):
@@ -63,73 +103,340 @@ def translate_to_english(text):
 def translate_to_hindi(text):
     return translator.translate(text, src='en', dest='hi').text
 
-def retrieve_context(query, k=3):
-    query_vec = embed_model.encode([query], normalize_embeddings=True)
-    _, I = index.search(query_vec, k)
-    return "\n---\n".join([documents[i] for i in I[0]])
+# Templated replies repeat, so their translations are cached.
+@lru_cache(maxsize=128)
+def translate_template_to_hindi(text):
+    return translate_to_hindi(text)
 
-def build_prompt(query, context):
-    return f"""You are a helpful college assistant at Graphic Era Hill University, Bhimtal Campus.
+def retrieve_context(query, max_k=ADAPTIVE_MAX_K, query_vec=None):
+    return retriever.retrieve_adaptive(query, max_k, query_vec)
 
-📌 Communication Guidelines:
-"tone": "friendly"
-"tone": "talkative"
-"tone": "humorous"
-- Keep replies short and natural — 1–2 sentences unless asked otherwise.
-- Speak conversationally like a real person.
-- Don't invent facts.
+# ---------------- Reply Pipeline ----------------
+# Shared by /chat and the /ws channel: retrieval, prompt, limits and the
+# generation to run (or join) for an English question.
+def plan_reply(query, query_vec, session_id, tenant=None, detail=None, max_tokens=None):
+    if tenant:
+        hits = tenants.retrieve_adaptive(query, tenant, query_vec=query_vec)
+    else:
+        hits = retrieve_context(query, query_vec=query_vec)
+    history = conversations.history(session_id)
+    prompt = build_prompt(query, format_context(hits), history)
 
-Conversation History:
-{format_history()}
+    # Replies are capped at a few sentences unless the user asks for detail
+    max_tokens = min(int(max_tokens or 0), DETAILED_MAX_TOKENS) or None
+    options = generation_options(query, detail=detail, max_tokens=max_tokens)
+    model_route = models.choose(query, hits)
+    key = coalesce_key(query, hits, history, models.model(model_route), options)
+    generate = lambda cancel: backends.stream(prompt, models.model(model_route), cancel, options)
+    return hits, key, model_route, generate
 
-Context:
-{context}
+# Yields the reply as it is generated, or an extractive answer in one piece
+# when generation is saturated, slow or failing; outcome["fallback"] records
+# which. Closing the generator leaves the flight, cancelling the generation
+# if nobody else is waiting on it. A set cancel event (barge-in) ends it early
+# without computing the fallback.
+def reply_chunks(key, generate, query_vec, hits, timeout, outcome, cancel=None):
+    parts = []
+    try:
+        if saturated(key):
+            outcome["fallback"] = "saturated"
+        else:
+            for chunk in coalescer.stream(key, generate, timeout, FIRST_TOKEN_DEADLINE, cancel):
+                parts.append(chunk)
+                yield chunk
+    except TimeoutError:
+        if parts:
+            metrics.incr("chat.timeout")
+            return
+        outcome["fallback"] = "slow"
+    except Exception as e:
+        print(f"[ERROR] Ollama stream failed: {e}")
+        if parts:
+            return
+        outcome["fallback"] = "error"
+    if outcome["fallback"] and not (cancel is not None and cancel.is_set()):
+        yield extractive.answer(query_vec, hits, outcome["fallback"])
 
-User: {query}
-Answer:"""
+# ---------------- Request Validation ----------------
+# Each returns an error message for the client, or None when the value is fine.
+def tenant_error(tenant):
+    if not tenant or tenant == ALL_TENANTS:
+        return None
+    if not isinstance(tenant, str) and not (isinstance(tenant, list) and all(isinstance(t, str) for t in tenant)):
+        return 'tenant must be a campus name, a list of names or "*"'
+    if not set(tenants.resolve(tenant)) <= set(tenants.names()):
+        return f"Unknown tenant; available: {', '.join(tenants.names())}"
+    return None
 
-def query_ollama(prompt):
-    response = requests.post(OLLAMA_URL, json={
-        "model": MODEL_NAME,
-        "prompt": prompt,
-        "stream": False
-    })
-    response.raise_for_status()
-    return response.json()["response"].strip()
+# kind(value) when it is a positive finite number, None otherwise.
+def positive_number(value, kind):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = kind(value)
+        return number if math.isfinite(number) and number > 0 else None
+    except (TypeError, ValueError, OverflowError):
+        return None
 
 # ---------------- API Endpoint ----------------
 @app.route('/chat', methods=['POST'])
 def chat():
-    data = request.get_json()
+    start = time.perf_counter()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
     user_message = data.get("message")
     user_lang = data.get("lang", "en")  # default to English if not provided
+    session_id = data.get("session") or request.remote_addr
 
-    if not user_message:
+    if not user_message or not isinstance(user_message, str):
         return jsonify({"error": "No message provided"}), 400
 
+    # Clients can ask for a shorter deadline than ours (the Android app gives up sooner)
+    timeout = positive_number(data.get("timeout") or CHAT_TIMEOUT, float)
+    if timeout is None:
+        return jsonify({"error": "timeout must be a positive number of seconds"}), 400
+    timeout = min(timeout, MAX_CHAT_TIMEOUT)
+    max_tokens = data.get("max_tokens")
+    if max_tokens is not None:
+        max_tokens = positive_number(max_tokens, int)
+        if max_tokens is None:
+            return jsonify({"error": "max_tokens must be a positive integer"}), 400
+
+    tenant = data.get("tenant")
+    error = tenant_error(tenant)
+    if error:
+        return jsonify({"error": error}), 400
+
     # Translate input to English if user is using Hindi mode
     if user_lang == 'hi':
         translated_input = translate_to_english(user_message)
     else:
         translated_input = user_message
 
-    # Retrieve relevant college data
-    context = retrieve_context(translated_input)
-    prompt = build_prompt(translated_input, context)
+    # Greetings, small talk and commands are answered without the LLM
+    query_vec = retriever.encode([translated_input])
+    route = (tenant_router if tenant else router).route(translated_input, query_vec)
+    if route.reply is not None:
+        final_reply = translate_template_to_hindi(route.reply) if user_lang == 'hi' else route.reply
+        log_chat_to_file(user_message, final_reply, session=session_id, lang=user_lang,
+                         latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                         intent=route.intent, chunk_ids=[])
+        return jsonify({"response": final_reply, "intent": route.intent})
 
-    try:
-        raw_reply = query_ollama(prompt)
-    except Exception as e:
-        return jsonify({"error": f"Ollama request failed: {str(e)}"}), 500
+    hits, key, model_route, generate = plan_reply(translated_input, query_vec, session_id, tenant,
+                                                  detail=data.get("detail"), max_tokens=max_tokens)
+    generation_start = time.perf_counter()
+
+    # English replies can be streamed to the client as they are generated
+    if data.get("stream") and user_lang != 'hi':
+        def stream_reply():
+            parts, outcome = [], {"fallback": None}
+            try:
+                for chunk in reply_chunks(key, generate, query_vec, hits, timeout, outcome):
+                    parts.append(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # The client hung up; leaving the flight cancels the generation if nobody else waits on it
+                metrics.incr("chat.disconnected")
+                raise
+            final_reply = "".join(parts).strip()
+            if not outcome["fallback"]:
+                models.record(model_route, time.perf_counter() - generation_start)
+                conversations.add(session_id, translated_input, final_reply)
+            log_chat_to_file(user_message, final_reply, session=session_id, lang=user_lang,
+                             latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                             chunk_ids=[hit["id"] for hit in hits], k=len(hits), model=model_route,
+                             fallback=outcome["fallback"], tenant=tenant)
+        return Response(stream_with_context(stream_reply()), mimetype="text/plain")
+
+    fallback = None
+    if saturated(key):
+        fallback = "saturated"
+    else:
+        try:
+            raw_reply = coalescer.result(key, generate, timeout, FIRST_TOKEN_DEADLINE).strip()
+            models.record(model_route, time.perf_counter() - generation_start)
+        except TimeoutError:
+            fallback = "slow"
+        except Exception as e:
+            print(f"[ERROR] Ollama request failed: {e}")
+            fallback = "error"
+    if fallback:
+        raw_reply = extractive.answer(query_vec, hits, fallback)
 
     # Translate reply back to Hindi if needed
     final_reply = translate_to_hindi(raw_reply) if user_lang == 'hi' else raw_reply
 
-    # Save to history and log
-    chat_history.append({"user": user_message, "bot": final_reply})
-    log_chat_to_file(user_message, final_reply)
+    # Save to history (in English, like the prompt) and log; extracted answers
+    # are not conversation the LLM should build on
+    if not fallback:
+        conversations.add(session_id, translated_input, raw_reply)
+    log_chat_to_file(user_message, final_reply, session=session_id, lang=user_lang,
+                     latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                     chunk_ids=[hit["id"] for hit in hits], k=len(hits), model=model_route, fallback=fallback,
+                     tenant=tenant)
 
+    if fallback:
+        return jsonify({"response": final_reply, "fallback": True})
     return jsonify({"response": final_reply})
 
+# ---------------- WebSocket Channel ----------------
+# One connection per app session (GET /ws?session=<id>&lang=en|hi). JSON
+# events in both directions:
+#   client: {"type": "message", "id": n, "text": ...}
+#           {"type": "session", "lang": ..., "tenant": ...}   language switch etc.
+#           {"type": "cancel"}                                 barge-in
+#   server: {"type": "ready", "session": ..., "lang": ...}
+#           {"type": "token", "id": n, "text": ...}            English only
+#           {"type": "sentence", "id": n, "text": ...}         each finished sentence, in the user's language
+#           {"type": "done", "id": n, "text": ...}             plus "intent" / "fallback" when set
+#           {"type": "cancelled", "id": n}, {"type": "error", ...}
+# A new message cancels the reply still in progress, like "cancel" does.
+class ChatSocket:
+    def __init__(self, ws, session_id, lang="en", tenant=None):
+        self.ws = ws
+        self.state = {"session": session_id, "lang": lang, "tenant": tenant}
+        self.send_lock = threading.Lock()
+        self.turn = None   # (id, cancel event) of the reply in progress
+        self.turns = 0
+
+    def send(self, **event):
+        try:
+            with self.send_lock:
+                self.ws.send(json.dumps(event, ensure_ascii=False))
+        except ConnectionClosed:
+            pass  # the receive loop sees the close and cancels the turn
+
+    def cancel(self):
+        if self.turn and not self.turn[1].is_set():
+            self.turn[1].set()
+            coalescer.wake()  # a turn still waiting for its first token leaves now
+            metrics.incr("ws.cancelled")
+            self.send(type="cancelled", id=self.turn[0])
+
+    def handle(self, event):
+        kind = event.get("type")
+        if kind == "cancel":
+            self.cancel()
+        elif kind == "session":
+            lang, tenant = event.get("lang", self.state["lang"]), event.get("tenant", self.state["tenant"])
+            if lang not in ("en", "hi"):
+                return self.send(type="error", error=f"Unsupported language: {lang}")
+            error = tenant_error(tenant)
+            if error:
+                return self.send(type="error", error=error)
+            self.state.update(lang=lang, tenant=tenant)
+            self.send(type="ready", session=self.state["session"], lang=lang)
+        elif kind == "message" and event.get("text"):
+            self.cancel()
+            self.turns += 1
+            self.turn = (event.get("id", self.turns), threading.Event())
+            threading.Thread(target=self.answer, args=(*self.turn, event["text"], dict(self.state)),
+                             daemon=True).start()
+        else:
+            self.send(type="error", error="Expected a message, session or cancel event")
+
+    def answer(self, turn_id, cancel, text, state):
+        def emit(**event):
+            if not cancel.is_set():
+                self.send(id=turn_id, **event)
+        try:
+            self.reply(turn_id, text, cancel, state, emit)
+        except Exception as e:
+            print(f"[ERROR] WebSocket reply failed: {e}")
+            emit(type="error", error="Could not answer that, please try again")
+        finally:
+            cancel.set()  # finished turns cannot be cancelled any more
+
+    def reply(self, turn_id, text, cancel, state, emit):
+        start = time.perf_counter()
+        lang, session_id, tenant = state["lang"], state["session"], state["tenant"]
+        query = translate_to_english(text) if lang == 'hi' else text
+        query_vec = retriever.encode([query])
+        route = (tenant_router if tenant else router).route(query, query_vec)
+        if route.reply is not None:
+            final_reply = translate_template_to_hindi(route.reply) if lang == 'hi' else route.reply
+            emit(type="sentence", text=final_reply)
+            emit(type="done", text=final_reply, intent=route.intent)
+            log_chat_to_file(text, final_reply, session=session_id, lang=lang, channel="ws",
+                             latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                             intent=route.intent, chunk_ids=[])
+            return
+
+        hits, key, model_route, generate = plan_reply(query, query_vec, session_id, tenant)
+        generation_start = time.perf_counter()
+        parts, spoken, outcome = [], [], {"fallback": None}
+        sentences = SentenceBuffer()
+
+        def speak(batch):
+            for sentence in batch:
+                sentence = translate_to_hindi(sentence) if lang == 'hi' else sentence
+                spoken.append(sentence)
+                emit(type="sentence", text=sentence)
+
+        chunks = reply_chunks(key, generate, query_vec, hits, CHAT_TIMEOUT, outcome, cancel)
+        try:
+            for chunk in chunks:
+                if cancel.is_set():
+                    break
+                parts.append(chunk)
+                if lang != 'hi':
+                    emit(type="token", text=chunk)
+                speak(sentences.feed(chunk))
+            else:
+                speak(sentences.flush())
+        finally:
+            # Leaves the flight on barge-in, which stops the Ollama generation
+            # unless another request is waiting on it
+            chunks.close()
+
+        raw_reply = "".join(parts).strip()
+        final_reply = " ".join(spoken) if lang == 'hi' else raw_reply
+        cancelled = cancel.is_set()
+        if not cancelled:
+            emit(type="done", text=final_reply, **({"fallback": True} if outcome["fallback"] else {}))
+            if not outcome["fallback"]:
+                models.record(model_route, time.perf_counter() - generation_start)
+                conversations.add(session_id, query, raw_reply)
+        log_chat_to_file(text, final_reply, session=session_id, lang=lang, channel="ws",
+                         latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                         chunk_ids=[hit["id"] for hit in hits], k=len(hits), model=model_route,
+                         fallback=outcome["fallback"], tenant=tenant, cancelled=cancelled)
+
+@sock.route('/ws')
+def chat_socket(ws):
+    lang, tenant = request.args.get("lang", "en"), request.args.get("tenant")
+    error = tenant_error(tenant)
+    channel = ChatSocket(ws, request.args.get("session") or uuid.uuid4().hex, "hi" if lang == "hi" else "en",
+                         None if error else tenant)
+    metrics.incr("ws.connections")
+    if error:
+        channel.send(type="error", error=error)
+    channel.send(type="ready", session=channel.state["session"], lang=channel.state["lang"])
+    try:
+        while True:
+            try:
+                event = json.loads(ws.receive())
+            except (TypeError, ValueError):
+                channel.send(type="error", error="Events must be JSON objects")
+                continue
+            if isinstance(event, dict):
+                channel.handle(event)
+            else:
+                channel.send(type="error", error="Events must be JSON objects")
+    except ConnectionClosed:
+        pass
+    finally:
+        # Nobody is left to hear the reply in progress
+        if channel.turn:
+            channel.turn[1].set()
+            coalescer.wake()
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({**metrics.snapshot(), "backends": backends.status(), "models": ModelRouter.stats(),
+                    "tenants": tenants.status()})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5050)
\ No newline at end of file
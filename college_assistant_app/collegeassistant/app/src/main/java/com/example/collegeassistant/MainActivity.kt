@@ -31,11 +31,18 @@ import com.airbnb.lottie.LottieDrawable
 import kotlinx.coroutines.CoroutineScope
 import kotlinx.coroutines.Dispatchers
 import kotlinx.coroutines.launch
+import okhttp3.OkHttpClient
+import okhttp3.Request
+import okhttp3.Response
+import okhttp3.WebSocket
+import okhttp3.WebSocketListener
+import org.json.JSONObject
 import retrofit2.Retrofit
 import retrofit2.converter.gson.GsonConverterFactory
 import java.util.*
+import java.util.concurrent.TimeUnit
 
-data class ChatRequest(val message: String, val lang: String)
+data class ChatRequest(val message: String, val lang: String, val session: String)
 data class ChatResponse(val response: String)
 
 interface ChatApi {
@@ -61,6 +68,14 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
     private var isWaitingForResponse = false
     private val showAvatar = mutableStateOf(false)
 
+    // One WebSocket per app session; replies arrive sentence by sentence so
+    // TTS starts before the whole answer is generated.
+    private val httpClient = OkHttpClient.Builder().pingInterval(20, TimeUnit.SECONDS).build()
+    private var socket: WebSocket? = null
+    private lateinit var sessionId: String
+    private var turnId = 0
+    private var pendingText: String? = null
+
     private val requestMicPermission = registerForActivityResult(
         ActivityResultContracts.RequestPermission()
     ) { granted ->
@@ -77,6 +92,8 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
         sharedPreferences = getSharedPreferences("app_prefs", Context.MODE_PRIVATE)
         backendUrl.value = sharedPreferences.getString("backend_url", "") ?: ""
         if (backendUrl.value.isBlank()) showUrlDialog.value = true
+        sessionId = sharedPreferences.getString("session_id", null)
+            ?: UUID.randomUUID().toString().also { id -> sharedPreferences.edit { putString("session_id", id) } }
 
         initSpeechRecognizer()
         tts = TextToSpeech(this, this)
@@ -87,6 +104,7 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
     }
 
     override fun onDestroy() {
+        socket?.close(1000, null)
         speechRecognizer.destroy()
         tts.shutdown()
         super.onDestroy()
@@ -220,6 +238,10 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
             Toast.makeText(this, "Speech recognition not supported", Toast.LENGTH_SHORT).show()
             return
         }
+        // Barge-in: speaking over the assistant stops its reply on the server too
+        if (isWaitingForResponse || (ttsReady && tts.isSpeaking)) {
+            cancelReply()
+        }
         if (!isListening.value && !isWaitingForResponse) {
             restartListening(0)
         }
@@ -230,15 +252,88 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
         sendMessageToBackend(text)
     }
 
+    private fun connectSocket(): WebSocket {
+        socket?.let { return it }
+        val request = Request.Builder()
+            .url("${backendUrl.value}ws?session=$sessionId&lang=${selectedLang.value}")
+            .build()
+        return httpClient.newWebSocket(request, object : WebSocketListener() {
+            override fun onMessage(webSocket: WebSocket, text: String) {
+                val event = JSONObject(text)
+                runOnUiThread { onSocketEvent(event) }
+            }
+
+            override fun onClosed(webSocket: WebSocket, code: Int, reason: String) {
+                runOnUiThread { if (socket == webSocket) socket = null }
+            }
+
+            override fun onFailure(webSocket: WebSocket, t: Throwable, response: Response?) {
+                runOnUiThread {
+                    if (socket == webSocket) socket = null
+                    // Older servers have no /ws: answer this turn over plain HTTP instead
+                    val text = pendingText
+                    if (text != null) {
+                        sendOverHttp(text)
+                    } else if (isWaitingForResponse) {
+                        backendResponse.value += " (connection lost)"
+                        isWaitingForResponse = false
+                    }
+                }
+            }
+        }).also { socket = it }
+    }
+
+    private fun onSocketEvent(event: JSONObject) {
+        if (event.has("id") && event.optInt("id") != turnId) return  // a reply we already cancelled
+        when (event.optString("type")) {
+            "token" -> backendResponse.value += event.getString("text")
+            "sentence" -> {
+                pendingText = null
+                if (selectedLang.value == "hi") backendResponse.value += event.getString("text") + " "
+                speakText(event.getString("text"), TextToSpeech.QUEUE_ADD)
+            }
+            "done" -> {
+                pendingText = null
+                backendResponse.value = event.getString("text")
+                isWaitingForResponse = false
+            }
+            "error" -> {
+                pendingText = null
+                backendResponse.value = "Error: ${event.optString("error")}"
+                isWaitingForResponse = false
+            }
+        }
+    }
+
+    private fun cancelReply() {
+        socket?.send(JSONObject().put("type", "cancel").toString())
+        if (ttsReady) tts.stop()
+        pendingText = null
+        isWaitingForResponse = false
+    }
+
     private fun sendMessageToBackend(text: String) {
         if (backendUrl.value.isBlank()) {
             Toast.makeText(this, "Please set backend URL first", Toast.LENGTH_SHORT).show()
             return
         }
 
+        if (ttsReady) tts.stop()
+        turnId += 1
+        pendingText = text
+        backendResponse.value = ""
         isWaitingForResponse = true
         isListening.value = false
 
+        val event = JSONObject().put("type", "message").put("id", turnId).put("text", text)
+        if (!connectSocket().send(event.toString())) {
+            socket = null
+            sendOverHttp(text)
+        }
+    }
+
+    private fun sendOverHttp(text: String) {
+        pendingText = null
         CoroutineScope(Dispatchers.IO).launch {
             try {
                 val retrofit = Retrofit.Builder()
@@ -247,7 +342,7 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
                     .build()
 
                 val api = retrofit.create(ChatApi::class.java)
-                val response = api.sendMessage(ChatRequest(text, selectedLang.value))
+                val response = api.sendMessage(ChatRequest(text, selectedLang.value, sessionId))
 
                 if (response.isSuccessful) {
                     val reply = response.body()?.response ?: "No response"
@@ -271,9 +366,9 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
         }
     }
 
-    private fun speakText(text: String) {
+    private fun speakText(text: String, queueMode: Int = TextToSpeech.QUEUE_FLUSH) {
         if (ttsReady) {
-            tts.speak(text, TextToSpeech.QUEUE_FLUSH, null, "utteranceId")
+            tts.speak(text, queueMode, null, "utteranceId")
         }
     }
 
@@ -308,6 +403,7 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
                         LanguageDropdown(selectedLang.value) {
                             selectedLang.value = it
                             updateTTSLanguage(it)
+                            socket?.send(JSONObject().put("type", "session").put("lang", it).toString())
                         }
                         Spacer(Modifier.width(16.dp))
                         if (isListening.value) {
@@ -324,7 +420,7 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
                     Text(backendResponse.value)
 
                     Button(
-                        enabled = backendUrl.value.isNotBlank() && !isListening.value && !isWaitingForResponse,
+                        enabled = backendUrl.value.isNotBlank() && !isListening.value,
                         onClick = { startVoiceInput() }
                     ) {
                         Text("Start Voice Input")
@@ -382,6 +478,8 @@ class MainActivity : ComponentActivity(), TextToSpeech.OnInitListener {
                     onSave = { urlInput ->
                         val fixed = validateAndFixUrl(urlInput)
                         if (fixed != null) {
+                            socket?.close(1000, null)
+                            socket = null
                             backendUrl.value = fixed
                             sharedPreferences.edit { putString("backend_url", fixed) }
                             showUrlDialog.value = false
@@ -0,0 +1,45 @@
+import os
+import sys
+import subprocess
+import multiprocessing
+
+# Multi-worker deployment of app.py:
+#   cd college_assistant_app && gunicorn app:app
+#
+# The index artifact is built once by the master before any worker starts.
+# Every worker then memory-maps the same read-only vectors and chunk store
+# (shared through the page cache, untouched by copy-on-write) and runs its
+# own small int8 ONNX session for query encoding, so no worker imports torch.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("RETRIEVER_MMAP", "1")
+os.environ.setdefault("EMBED_BACKEND", "onnx-int8")
+# One worker per core: a session using every core in every worker would only
+# oversubscribe the CPU.
+os.environ.setdefault("ONNX_THREADS", "1")
+
+bind = os.environ.get("BIND", "0.0.0.0:5050")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Threaded workers: every open /ws connection holds a thread for as long as
+# the app session lasts, on top of the short /chat requests.
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+# Workers import app.py after the fork, so the ONNX session and its thread
+# pool are never shared across processes.
+preload_app = False
+timeout = 60
+
+
+def on_starting(server):
+    sys.path.insert(0, ROOT_DIR)
+    from retrieval import Retriever
+    if not Retriever().is_fresh():
+        server.log.info("Building shared index artifact...")
+        # Build in a child process so the master never holds the embedding model.
+        subprocess.run([sys.executable, os.path.join(ROOT_DIR, "retrieval.py")], check=True)
+    # Per-campus indexes are only loaded on demand, but workers map them
+    # read-only too, so they must exist before the first tenant request.
+    from tenants import TenantRegistry
+    registry = TenantRegistry(budget_mb=0)
+    if not all(registry.retriever(name).is_fresh() for name in registry.names()):
+        server.log.info("Building tenant index artifacts...")
+        subprocess.run([sys.executable, os.path.join(ROOT_DIR, "tenants.py"), "build"], check=True)
@@ -1,36 +1,73 @@
 import os
-import subprocess
-import faiss
+import sys
 import re
-import numpy as np
-import soundfile as sf
-import simpleaudio as sa
-import speech_recognition as sr
-from sentence_transformers import SentenceTransformer
-from datetime import datetime
-from TTS.api import TTS
-from kokoro import KPipeline
-from googletrans import Translator
+
+# The retrieval module and its prebuilt index live at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from startup import Background, timed, report_startup, wants_startup_report
+from retrieval import get_retriever, format_context, ADAPTIVE_MAX_K
+from chat_log import ChatLogWriter
+from intent_router import IntentRouter, MEMORY_PATTERN
+from structured_lookup import StructuredLookup
+from faq_bank import FaqBank
+from llm import run_llm_process, generation_options, CANCELLED
+from extractive import ExtractiveAnswerer
+from conversation import ConversationStore, summary_options
+
+# ---------------- Background Loading ----------------
+# Retrieval does not depend on the language, so it starts loading before the
+# prompt below is even shown.
+retriever_loader = Background("retriever", lambda: get_retriever().warm())
 
 # ---------------- Initial Language Preference ----------------
 user_lang = input("\U0001F310 Select language (en/hi): ").strip().lower()
 assert user_lang in ["en", "hi"], "Please choose either 'en' or 'hi'"
 
-translator = Translator()
+def load_translator():
+    with timed("import googletrans"):
+        from googletrans import Translator
+    return Translator()
+
+def load_tts_en():
+    with timed("import TTS"):
+        from TTS.api import TTS
+    return TTS(model_name="tts_models/en/vctk/vits", progress_bar=False, gpu=False)
+
+def load_pipeline_hi():
+    with timed("import kokoro"):
+        from kokoro import KPipeline
+    return KPipeline(lang_code="hi")
+
+def load_speech_recognition():
+    with timed("import speech_recognition"):
+        import speech_recognition as sr
+    return sr
+
+# Only the voice stack for the chosen language is ever imported.
+if user_lang == "hi":
+    translator_loader = Background("translator", load_translator)
+    tts_loader = Background("kokoro", load_pipeline_hi)
+else:
+    translator_loader = None
+    tts_loader = Background("coqui tts", load_tts_en)
+speech_loader = Background("speech_recognition", load_speech_recognition)
 
 # ---------------- Text-to-Speech ----------------
-tts_en = TTS(model_name="tts_models/en/vctk/vits", progress_bar=False, gpu=False)
 MALE_SPEAKER = "p233"
-pipeline_hi = KPipeline(lang_code="hi")
 
 def speak_en(text):
-    tts_en.tts_to_file(text=text, speaker=MALE_SPEAKER, file_path="speech_en.wav")
+    import simpleaudio as sa
+    tts_loader.get().tts_to_file(text=text, speaker=MALE_SPEAKER, file_path="speech_en.wav")
     sa.WaveObject.from_wave_file("speech_en.wav").play().wait_done()
 
 def split_text_hi(text):
     return [chunk.strip() for chunk in re.split(r'(?<=[।!?])\s*', text) if chunk.strip()]
 
 def speak_hi(text):
+    import numpy as np
+    import soundfile as sf
+    import simpleaudio as sa
+    pipeline_hi = tts_loader.get()
     chunks = split_text_hi(text)
     audio_parts = []
     for chunk in chunks:
@@ -50,6 +87,7 @@ def speak(text):
 
 # ---------------- Speech Input ----------------
 def recognize_speech():
+    sr = speech_loader.get()
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
         print("\U0001F3A4 Speak now...")
@@ -64,59 +102,40 @@ def recognize_speech():
         return ""
 
 # ---------------- Config ----------------
-DATA_DIR = "college_data"
-MEMORY_FILE = "memory.txt"
-EMBED_MODEL_PATH = "./embedding_models/all-MiniLM-L6-v2"
-HISTORY_DEPTH = 1
-
-# ---------------- Load Data ----------------
-def load_documents():
-    docs = []
-    for root, _, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith(".txt"):
-                with open(os.path.join(root, file), "r", encoding="utf-8", errors="ignore") as f:
-                    for chunk in f.read().split("\n\n"):
-                        if chunk.strip():
-                            docs.append(chunk.strip())
-    return docs
-
-def load_memory():
-    return [line.strip() for line in open(MEMORY_FILE, "r", encoding="utf-8")] if os.path.exists(MEMORY_FILE) else []
-
-def save_memory_line(line):
-    with open(MEMORY_FILE, "a", encoding="utf-8") as f:
-        f.write(line.strip() + "\n")
-
-# ---------------- Embedding ----------------
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
-print("[INFO] Loading embedding model...")
-embed_model = SentenceTransformer(EMBED_MODEL_PATH)
-documents = load_documents() + load_memory()
-print(f"[INFO] Loaded {len(documents)} chunks.")
-embeddings = embed_model.encode(documents, normalize_embeddings=True)
-index = faiss.IndexFlatIP(embeddings.shape[1])
-index.add(embeddings)
+SESSION = "local"
 
 # ---------------- LLM + Prompt ----------------
-def retrieve_context(query, k=3):
-    query_vec = embed_model.encode([query], normalize_embeddings=True)
-    _, I = index.search(query_vec, k)
-    return "\n---\n".join([documents[i] for i in I[0]])
+router = IntentRouter(lambda texts: retriever_loader.get().encode(texts),
+                      lambda fact: retriever_loader.get().remember(fact),
+                      handlers=[StructuredLookup(), FaqBank(lambda texts: retriever_loader.get().encode(texts))])
+
+def retrieve_context(query, max_k=ADAPTIVE_MAX_K, query_vec=None):
+    return retriever_loader.get().retrieve_adaptive(query, max_k, query_vec)
+
+# Answers from the retrieved chunks when Ollama fails or times out
+extractive = ExtractiveAnswerer(lambda texts: retriever_loader.get().encode(texts))
+
+# Returns None when Ollama failed; the caller falls back to an extractive answer.
+# CANCELLED means Ctrl+C: the turn is dropped.
 
-def ask_llama(prompt):
+def ask_llama(prompt, options=None):
     try:
-        result = subprocess.run(["ollama", "run", "llama3.2"], input=prompt.encode("utf-8"),
-                                capture_output=True, timeout=30)
+        result = run_llm_process(["ollama", "run", "llama3.2"], prompt, timeout=30, options=options)
         if result.returncode != 0:
             print("[ERROR] Ollama error:", result.stderr.decode())
-            return "[ERROR] LLM failure."
-        return result.stdout.decode().strip()
+            return None
+        return result.stdout.decode().strip() or None
+    except KeyboardInterrupt:
+        return CANCELLED
     except Exception as e:
-        return f"[ERROR] Llama call failed: {e}"
+        print(f"[ERROR] Llama call failed: {e}")
+        return None
+
+# Recent turns verbatim, older ones summarized by Ollama while the reply is spoken
+conversation = ConversationStore(lambda prompt: ask_llama(prompt, summary_options()))
 
 def build_prompt(query, context):
-    history = "\n".join([f"User: {h['user']}\nBot: {h['bot']}" for h in chat_history[-HISTORY_DEPTH:]])
+    history = conversation.history(SESSION)
     return f"""You are a helpful college assistant at Graphic Era Hill University, Bhimtal Campus.
 
 📌 Communication Guidelines:
@@ -138,14 +157,13 @@ User: {query}
 Answer:"""
 
 # ---------------- Chat Loop ----------------
-chat_history = []
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-os.makedirs("chats", exist_ok=True)
-chat_log_path = f"chats/chat_{timestamp}.txt"
+chat_log = ChatLogWriter()
+
+def log_chat(user, bot, **fields):
+    chat_log.log(user, bot, **fields)
 
-def log_chat(user, bot):
-    with open(chat_log_path, "a", encoding="utf-8") as f:
-        f.write(f"User: {user}\nBot: {bot}\n\n")
+if wants_startup_report():
+    report_startup([loader for loader in (retriever_loader, translator_loader, tts_loader, speech_loader) if loader])
 
 print("\n🤖 CollegeBot is ready with Speech Input. Type or say something! (Type 'exit' to quit)")
 while True:
@@ -157,28 +175,39 @@ while True:
     if user_input.lower() == "exit":
         break
 
-    if user_input.lower().startswith(("remember that", "learn that")):
-        fact = user_input.partition("that")[2].strip()
-        if fact:
-            save_memory_line(fact)
-            print("✅ Remembered.")
+    # Memory commands are typed in English even in Hindi mode
+    if user_lang == "hi" and not MEMORY_PATTERN.match(user_input):
+        translator = translator_loader.get()
+        query = translator.translate(user_input, src="hi", dest="en").text
+    else:
+        query = user_input
+
+    # Greetings, small talk and commands are answered without the LLM
+    query_vec = retriever_loader.get().encode([query])
+    route = router.route(query, query_vec)
+    hits, fallback = [], None
+    if route.reply is not None:
+        raw_reply = route.reply
+    else:
+        hits = retrieve_context(query, query_vec=query_vec)
+        prompt = build_prompt(query, format_context(hits))
+        raw_reply = ask_llama(prompt, generation_options(query))
+        if raw_reply is CANCELLED:
+            print("\n[Cancelled] Generation stopped.")
+            continue
+        if raw_reply is None:
+            fallback = "error"
+            raw_reply = extractive.answer(query_vec, hits, fallback)
+            print("\n⚡ Quick answer from the college documents:")
         else:
-            print("⚠️ Please provide a fact after 'remember that'")
-        continue
+            conversation.add(SESSION, query, raw_reply)
 
     if user_lang == "hi":
-        translated_input = translator.translate(user_input, src="hi", dest="en").text
-        context = retrieve_context(translated_input)
-        prompt = build_prompt(translated_input, context)
-        raw_reply = ask_llama(prompt)
-        final_reply = translator.translate(raw_reply, src="en", dest="hi").text
+        final_reply = translator_loader.get().translate(raw_reply, src="en", dest="hi").text
     else:
-        context = retrieve_context(user_input)
-        prompt = build_prompt(user_input, context)
-        raw_reply = ask_llama(prompt)
         final_reply = raw_reply
 
     print(f"\n🤖 CollegeBot: {final_reply}")
     speak(final_reply)
-    chat_history.append({"user": user_input, "bot": raw_reply})
-    log_chat(user_input, raw_reply)
\ No newline at end of file
+    log_chat(user_input, raw_reply, lang=user_lang, intent=route.intent,
+             chunk_ids=[hit["id"] for hit in hits], k=len(hits), fallback=fallback)
\ No newline at end of file
@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from llm import generation_options
+
+# ---------------- Config ----------------
+KEEP_TURNS = 3             # most recent turns kept verbatim
+MAX_HISTORY_TOKENS = 300   # budget for summary + verbatim turns in the prompt
+SUMMARY_TOKENS = 120
+SUMMARY_SENTENCES = 3
+MAX_SESSIONS = 1000        # least recently active sessions are forgotten first
+
+
+def estimate_tokens(text):
+    return len(text.split()) * 4 // 3
+
+
+def truncate_tokens(text, tokens):
+    words = text.split()
+    limit = tokens * 3 // 4
+    return text if len(words) <= limit else " ".join(words[:limit])
+
+
+def format_turns(turns):
+    return "\n".join(f"User: {turn['user']}\nBot: {turn['bot']}" for turn in turns)
+
+
+# Limits for the summarizer's generation call.
+def summary_options():
+    return generation_options(max_tokens=SUMMARY_TOKENS, max_sentences=SUMMARY_SENTENCES)
+
+
+def summary_prompt(summary, turns):
+    return f"""Update the memory of a campus assistant for Graphic Era Hill University, Bhimtal Campus.
+Keep the user's name, facts they shared, what they asked about and anything still unanswered.
+Write at most {SUMMARY_SENTENCES} short sentences. Do not add anything that is not in the conversation.
+
+Memory so far:
+{summary or "(empty)"}
+
+New conversation:
+{format_turns(turns)}
+
+Updated memory:"""
+
+
+class Conversation:
+    def __init__(self):
+        self.summary = ""
+        self.turns = []      # verbatim, oldest first
+        self.pending = []    # turns handed to the summarizer but not yet folded in
+        self.summarizing = False
+        self.lock = threading.Lock()
+
+
+# Keeps each session's last KEEP_TURNS turns verbatim and folds older turns
+# into a running summary, so prompts remember the whole conversation at a
+# bounded size. Summaries are produced by summarize(prompt) -> text (an LLM
+# call) on a single background thread after the reply has been produced,
+# never while a user is waiting. Until a summary lands, the turns waiting
+# for it are still shown verbatim, within the same token budget.
+class ConversationStore:
+    def __init__(self, summarize=None, keep_turns=KEEP_TURNS, max_tokens=MAX_HISTORY_TOKENS,
+                 max_sessions=MAX_SESSIONS):
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+
+    def get(self, session_id):
+        with self.lock:
+            conversation = self.sessions.get(session_id)
+            if conversation is None:
+                conversation = self.sessions[session_id] = Conversation()
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session_id)
+            return conversation
+
+    def history(self, session_id):
+        conversation = self.get(session_id)
+        with conversation.lock:
+            summary = conversation.summary
+            turns = conversation.pending + conversation.turns
+        # Newest turns first until the budget is used up, then the summary.
+        kept, used = [], 0
+        for turn in reversed(turns):
+            cost = estimate_tokens(format_turns([turn]))
+            if kept and used + cost > self.max_tokens:
+                break
+            kept.insert(0, turn)
+            used += cost
+        lines = []
+        if summary and used < self.max_tokens:
+            lines.append(f"(Earlier in this conversation: {truncate_tokens(summary, self.max_tokens - used)})")
+        if kept:
+            lines.append(format_turns(kept))
+        return "\n".join(lines)
+
+    def add(self, session_id, user, bot):
+        conversation = self.get(session_id)
+        with conversation.lock:
+            conversation.turns.append({"user": user, "bot": bot})
+            overflow = len(conversation.turns) - self.keep_turns
+            if overflow <= 0:
+                return
+            if self.summarize is None:
+                del conversation.turns[:overflow]
+                return
+            conversation.pending += conversation.turns[:overflow]
+            del conversation.turns[:overflow]
+            if conversation.summarizing:
+                return  # the running job picks these turns up when it finishes
+            conversation.summarizing = True
+        self.executor.submit(self.fold, conversation)
+
+    def fold(self, conversation):
+        while True:
+            with conversation.lock:
+                turns = list(conversation.pending)
+                summary = conversation.summary
+                if not turns:
+                    conversation.summarizing = False
+                    return
+            try:
+                updated = self.summarize(summary_prompt(summary, turns))
+                metrics.incr("conversation.summaries")
+            except Exception as e:
+                print(f"[WARN] Conversation summary failed: {e}")
+                updated = None
+            with conversation.lock:
+                if updated:
+                    conversation.summary = truncate_tokens(updated.strip(), SUMMARY_TOKENS)
+                else:
+                    metrics.incr("conversation.summary_failures")
+                # Drop the folded turns either way: keeping them would grow the
+                # pending list without bound while the LLM is unavailable.
+                del conversation.pending[:len(turns)]
+
+    def clear(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
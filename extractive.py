@@ -0,0 +1,78 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import metrics
+
+# ---------------- Config ----------------
+FALLBACK_SENTENCES = 2
+MIN_SENTENCE_WORDS = 3
+MIN_FALLBACK_SCORE = 0.3   # cosine a sentence needs to be worth quoting
+RELATIVE_SCORE = 0.85      # further sentences must score this fraction of the best one
+CACHE_SIZE = 4096          # chunks whose sentence vectors are kept
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+BUSY_REPLY = "I'm a little overloaded right now. Please ask again in a moment."
+
+
+def split_sentences(text):
+    sentences = []
+    for part in SENTENCE_SPLIT.split(text):
+        part = re.sub(r"^[#>*\-\s]+|[*`]", "", part).strip()
+        if len(part.split()) >= MIN_SENTENCE_WORDS:
+            sentences.append(part)
+    return sentences
+
+
+# Degraded-mode answers: when the LLM is down, slow or saturated, reply with
+# the sentences from the already-retrieved chunks that are closest to the
+# query vector. Sentence vectors are cached per chunk id (least recently
+# used evicted first), so a fallback usually costs one small encoder batch
+# or nothing at all.
+class ExtractiveAnswerer:
+    def __init__(self, encode, max_sentences=FALLBACK_SENTENCES, min_score=MIN_FALLBACK_SCORE):
+        self.encode = encode
+        self.max_sentences = max_sentences
+        self.min_score = min_score
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def sentences(self, hits):
+        # Work from a local copy: other threads may evict entries meanwhile.
+        found = {}
+        with self.lock:
+            for hit in hits:
+                if hit["id"] in self.cache:
+                    self.cache.move_to_end(hit["id"])
+                    found[hit["id"]] = self.cache[hit["id"]]
+        missing = {hit["id"]: hit for hit in hits if hit["id"] not in found}
+        if missing:
+            texts = [split_sentences(hit["text"]) for hit in missing.values()]
+            flat = [sentence for sentences in texts for sentence in sentences]
+            vectors = self.encode(flat) if flat else np.zeros((0, 1), dtype="float32")
+            start = 0
+            for chunk_id, sentences in zip(missing, texts):
+                found[chunk_id] = (sentences, vectors[start:start + len(sentences)])
+                start += len(sentences)
+            with self.lock:
+                for chunk_id in missing:
+                    self.cache[chunk_id] = found[chunk_id]
+                while len(self.cache) > CACHE_SIZE:
+                    self.cache.popitem(last=False)
+        pairs = [found[hit["id"]] for hit in hits]
+        sentences = [sentence for chunk_sentences, _ in pairs for sentence in chunk_sentences]
+        vectors = [vector for _, chunk_vectors in pairs for vector in chunk_vectors]
+        return sentences, vectors
+
+    def answer(self, query_vec, hits, reason="fallback"):
+        metrics.incr(f"fallback.{reason}")
+        sentences, vectors = self.sentences(hits)
+        if not sentences:
+            return BUSY_REPLY
+        scores = np.stack(vectors) @ np.asarray(query_vec).reshape(-1)
+        order = np.argsort(-scores)
+        floor = max(self.min_score, scores[order[0]] * RELATIVE_SCORE)
+        best = [i for i in order[:self.max_sentences] if scores[i] >= floor]
+        if not best:
+            return BUSY_REPLY
+        # Keep document order so the sentences read naturally.
+        return " ".join(sentences[i] for i in sorted(best))
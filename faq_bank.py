@@ -0,0 +1,230 @@
+import os
+import json
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+import numpy as np
+import retrieval
+from intent_router import IntentRouter, normalize
+from prompts import build_prompt
+
+# FAQ answer bank:
+#   python faq_bank.py build --top 50   # mine chats/, generate answers for new or stale clusters
+#   python faq_bank.py vet              # review generated answers; only vetted ones are served
+#   python faq_bank.py list
+#
+# Each entry records the content hash of every source file its answer was
+# generated from. When one of those files changes the entry stops being
+# served and the next `build` regenerates it (and it needs vetting again).
+
+# ---------------- Config ----------------
+BANK_FILE = os.path.join(retrieval.BASE_DIR, "faq_bank.json")
+CHAT_DIRS = [os.path.join(retrieval.BASE_DIR, "chats"),
+             os.path.join(retrieval.BASE_DIR, "college_assistant_app", "chats")]
+CLUSTER_THRESHOLD = 0.85  # cosine for two logged questions to be the same FAQ
+MATCH_THRESHOLD = 0.9     # cosine for a live question to be served from the bank
+MIN_WORDS = 3
+MIN_COUNT = 2
+MAX_VARIANTS = 10
+
+
+def load_bank(path=BANK_FILE):
+    if not os.path.exists(path):
+        return {"entries": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_bank(bank, path=BANK_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(bank, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(entry, hashes):
+    return all(hashes.get(source) == content_hash for source, content_hash in entry["sources"].items())
+
+
+# ---------------- Mining ----------------
+def read_chat_questions(chat_dirs=CHAT_DIRS):
+    questions = []
+    for chat_dir in chat_dirs:
+        if not os.path.isdir(chat_dir):
+            continue
+        for file in sorted(os.listdir(chat_dir)):
+            path = os.path.join(chat_dir, file)
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                if file.endswith(".txt"):
+                    questions += [line[len("User: "):].strip() for line in f if line.startswith("User: ")]
+                elif file.endswith(".jsonl"):
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        # Turns already answered by a fast path are not FAQ material.
+                        if not record.get("intent"):
+                            questions.append(record.get("user", "").strip())
+    return questions
+
+
+def mine_clusters(questions, encode, threshold=CLUSTER_THRESHOLD, min_count=MIN_COUNT):
+    router = IntentRouter(encode)
+    counts = Counter()
+    originals = {}
+    for question in questions:
+        text = normalize(question)
+        # The embedding model is English-only; Hindi turns are translated before
+        # they reach the bank at serving time.
+        if len(text.split()) < MIN_WORDS or not text.isascii() or router.classify(question):
+            continue
+        counts[text] += 1
+        originals.setdefault(text, question)
+    if not counts:
+        return []
+
+    texts = [text for text, _ in counts.most_common()]
+    vectors = encode(texts)
+    clusters = []
+    for text, vector in zip(texts, vectors):
+        for cluster in clusters:
+            if float(cluster["vector"] @ vector) >= threshold:
+                cluster["variants"].append(originals[text])
+                cluster["count"] += counts[text]
+                break
+        else:
+            # Most frequent phrasing comes first and becomes the representative.
+            clusters.append({"question": originals[text], "variants": [originals[text]],
+                             "count": counts[text], "vector": vector})
+    clusters = [cluster for cluster in clusters if cluster["count"] >= min_count]
+    clusters.sort(key=lambda cluster: -cluster["count"])
+    return clusters
+
+
+# ---------------- Build ----------------
+def generate_entry(retriever, question, generate, hashes):
+    hits = retriever.retrieve(question)
+    return {
+        "answer": generate(build_prompt(question, retrieval.format_context(hits))),
+        "sources": {hit["source"]: hashes.get(hit["source"]) for hit in hits},
+        "chunk_ids": [hit["id"] for hit in hits],
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "vetted": False,
+    }
+
+
+def build(top=50, chat_dirs=CHAT_DIRS, path=BANK_FILE):
+    from llm import query_ollama
+    retriever = retrieval.get_retriever()
+    hashes = retrieval.source_hashes()
+    bank = load_bank(path)
+    known = {normalize(entry["question"]): entry for entry in bank["entries"]}
+
+    clusters = mine_clusters(read_chat_questions(chat_dirs), retriever.encode)[:top]
+    print(f"[INFO] {len(clusters)} frequent question clusters mined.")
+    for cluster in clusters:
+        entry = known.get(normalize(cluster["question"]))
+        if entry is None:
+            entry = {"question": cluster["question"]}
+            bank["entries"].append(entry)
+            known[normalize(cluster["question"])] = entry
+        entry["variants"] = cluster["variants"][:MAX_VARIANTS]
+        entry["count"] = cluster["count"]
+
+    for entry in bank["entries"]:
+        if entry.get("rejected") or ("answer" in entry and is_fresh(entry, hashes)):
+            continue
+        print(f"[INFO] Generating: {entry['question']}")
+        try:
+            entry.update(generate_entry(retriever, entry["question"], query_ollama, hashes))
+        except Exception as e:
+            print(f"[ERROR] {entry['question']}: {e}")
+            continue
+        save_bank(bank, path)
+
+    bank.pop("corpus_fingerprint", None)  # written by older builds; freshness is checked per source file
+    save_bank(bank, path)
+    print(f"[INFO] {len(bank['entries'])} entries in {path}; run `python faq_bank.py vet` to review new answers.")
+
+
+def vet(path=BANK_FILE):
+    bank = load_bank(path)
+    for entry in bank["entries"]:
+        if entry.get("vetted") or entry.get("rejected") or "answer" not in entry:
+            continue
+        print(f"\nQ ({entry.get('count', 0)}x): {entry['question']}\nA: {entry['answer']}")
+        choice = input("[a]ccept / [e]dit / [r]eject / [s]kip / [q]uit: ").strip().lower()
+        if choice == "q":
+            break
+        if choice == "a":
+            entry["vetted"] = True
+        elif choice == "e":
+            entry["answer"] = input("New answer: ").strip()
+            entry["vetted"] = True
+        elif choice == "r":
+            # Kept (not deleted) so the next build does not mine it again.
+            entry["rejected"] = True
+        save_bank(bank, path)
+
+
+# ---------------- Serving ----------------
+# Returns the banked answer when a live question is close enough to a vetted,
+# still-fresh entry (or one of its logged variants). Plugs into IntentRouter
+# as a handler under the "faq" intent and reuses the router's query vector.
+class FaqBank:
+    name = "faq"
+
+    def __init__(self, encode, path=BANK_FILE, threshold=MATCH_THRESHOLD):
+        self.encode = encode
+        self.threshold = threshold
+        hashes = retrieval.source_hashes()
+        entries = [entry for entry in load_bank(path)["entries"] if entry.get("vetted") and "answer" in entry]
+        self.entries = [entry for entry in entries if is_fresh(entry, hashes)]
+        if len(self.entries) < len(entries):
+            print(f"[WARN] {len(entries) - len(self.entries)} FAQ answers are stale; run `python faq_bank.py build`.")
+        self.vectors = None
+        self.owners = []
+        self.lock = threading.Lock()
+
+    def load_vectors(self):
+        with self.lock:
+            if self.vectors is None:
+                texts = []
+                for position, entry in enumerate(self.entries):
+                    for text in [entry["question"]] + entry.get("variants", []):
+                        texts.append(text)
+                        self.owners.append(position)
+                self.vectors = self.encode(texts) if texts else np.zeros((0, 1), dtype="float32")
+        return self.vectors
+
+    def answer(self, query, query_vec=None):
+        if not self.entries:
+            return None
+        if query_vec is None:
+            query_vec = self.encode([query])
+        scores = self.load_vectors() @ np.asarray(query_vec).reshape(-1)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self.entries[self.owners[best]]["answer"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine, generate and vet the FAQ answer bank.")
+    parser.add_argument("command", choices=["build", "vet", "list"])
+    parser.add_argument("--top", type=int, default=50, help="number of question clusters to keep")
+    parser.add_argument("--chats", action="append", help="chat log directory (repeatable)")
+    args = parser.parse_args()
+    if args.command == "build":
+        build(args.top, args.chats or CHAT_DIRS)
+    elif args.command == "vet":
+        vet()
+    else:
+        hashes = retrieval.source_hashes()
+        for entry in load_bank()["entries"]:
+            state = "rejected" if entry.get("rejected") else \
+                "stale" if "answer" in entry and not is_fresh(entry, hashes) else \
+                "vetted" if entry.get("vetted") else "pending"
+            print(f"{entry.get('count', 0):>4}x [{state}] {entry['question']}")
@@ -0,0 +1,277 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import multiprocessing
+from html.parser import HTMLParser
+
+# Document ingestion for the shared index artifact:
+#   python ingest.py                                  # rebuild index/ from college_data/
+#   python ingest.py --workers 8 --batch-size 512
+#   python ingest.py --data-dir college_data/notices --index-dir index/tenants/torch/notices --memory-file ""
+#
+# Files are parsed by a process pool and their chunks stream, in file order,
+# into batched embedding in the main process, so parsing and embedding
+# overlap. Chunks whose text was already seen (the same boilerplate in every
+# brochure) are indexed once. Retriever.build() uses the same pipeline, so
+# the result is the artifact the chat servers load.
+
+# ---------------- Config ----------------
+WORKERS = int(os.environ.get("INGEST_WORKERS", multiprocessing.cpu_count()))
+BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+MAX_CHUNK_WORDS = 300       # longer paragraphs (PDF pages, HTML blobs) are split
+MIN_PARAGRAPH_WORDS = 12    # shorter HTML/PDF paragraphs (headings, list items) join the next one
+MIN_POOL_FILES = 8          # fewer files are parsed in-process; the pool costs more than it saves
+PROGRESS_INTERVAL = 2.0     # seconds between progress lines
+READ_BLOCK = 64 * 1024
+
+
+# ---------------- Extractors ----------------
+# An extractor takes a file path and yields paragraphs of plain text.
+# Register more with @extractor(".docx") in this module so pool workers,
+# which import it fresh on some platforms, know them too.
+EXTRACTORS = {}
+
+
+def extractor(*extensions):
+    def register(function):
+        for extension in extensions:
+            EXTRACTORS[extension] = function
+        return function
+    return register
+
+
+def is_source(file_name):
+    return os.path.splitext(file_name)[1].lower() in EXTRACTORS
+
+
+@extractor(".txt", ".md")
+def extract_text(path):
+    paragraph = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            if line.strip():
+                paragraph.append(line)
+            elif paragraph:
+                yield "".join(paragraph)
+                paragraph = []
+    if paragraph:
+        yield "".join(paragraph)
+
+
+# Headings and list items make poor chunks on their own; .txt files keep
+# their hand-made paragraphs as they are.
+def merge_short(paragraphs, min_words=MIN_PARAGRAPH_WORDS):
+    pending = []
+    for paragraph in paragraphs:
+        pending.append(paragraph.strip())
+        if len(" ".join(pending).split()) >= min_words:
+            yield "\n".join(part for part in pending if part)
+            pending = []
+    if any(pending):
+        yield "\n".join(part for part in pending if part)
+
+
+class HtmlText(HTMLParser):
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "table", "section", "article", "header", "footer",
+                  "h1", "h2", "h3", "h4", "h5", "h6", "title", "ul", "ol", "dd", "dt", "blockquote", "pre"}
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.paragraphs = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.end_paragraph()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.end_paragraph()
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+    def end_paragraph(self):
+        text = " ".join("".join(self.parts).split())
+        if text:
+            self.paragraphs.append(text)
+        self.parts = []
+
+    def take(self):
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+
+@extractor(".html", ".htm")
+def extract_html(path):
+    return merge_short(html_paragraphs(path))
+
+
+def html_paragraphs(path):
+    parser = HtmlText()
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), ""):
+            parser.feed(block)
+            yield from parser.take()
+    parser.close()
+    parser.end_paragraph()
+    yield from parser.take()
+
+
+@extractor(".pdf")
+def extract_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("pypdf is not installed (pip install pypdf)")
+    # Blank lines survive in some PDFs; otherwise a page is one paragraph
+    # and gets split by length.
+    return merge_short(paragraph for page in PdfReader(path).pages
+                       for paragraph in re.split(r"\n\s*\n", page.extract_text() or ""))
+
+
+# ---------------- Chunking ----------------
+def split_long(text, max_words=MAX_CHUNK_WORDS):
+    words = text.split()
+    if len(words) <= max_words:
+        return [text]
+    return [" ".join(words[start:start + max_words]) for start in range(0, len(words), max_words)]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def list_sources(data_dir):
+    paths = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        paths += [os.path.join(root, file) for file in sorted(files) if is_source(file)]
+    return paths
+
+
+# Runs in a pool worker: one file in, its hash and chunks out. Errors are
+# returned rather than raised so one broken PDF does not stop the build.
+def parse_file(job):
+    path, source = job
+    try:
+        extract = EXTRACTORS[os.path.splitext(path)[1].lower()]
+        chunks = [{"source": source, "text": text}
+                  for paragraph in extract(path) if paragraph.strip()
+                  for text in split_long(paragraph.strip())]
+        return source, file_hash(path), chunks, None
+    except Exception as e:
+        return source, None, [], str(e)
+
+
+# ---------------- Pipeline ----------------
+class Progress:
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.start = self.last = time.perf_counter()
+        self.files_total = self.files = self.failed = self.duplicate_files = 0
+        self.chunks = self.duplicates = self.embedded = 0
+
+    def report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-9)
+        print(f"[INFO] files {self.files}/{self.files_total} ({self.files / elapsed:.1f}/s) | "
+              f"chunks {self.chunks} (+{self.duplicates} duplicate) | "
+              f"embedded {self.embedded} ({self.embedded / elapsed:.0f}/s)")
+
+    def done(self):
+        self.report(force=True)
+        print(f"[INFO] Ingested {self.files - self.failed - self.duplicate_files} files into {self.chunks} chunks "
+              f"in {time.perf_counter() - self.start:.1f}s ({self.failed} failed, "
+              f"{self.duplicate_files} duplicate files, {self.duplicates} duplicate chunks)")
+
+
+# Yields unique chunks in file order, then the extra ones (learned facts).
+def iter_chunks(data_dir, extra=(), workers=WORKERS, progress=None):
+    progress = progress or Progress(interval=float("inf"))
+    paths = list_sources(data_dir)
+    progress.files_total = len(paths)
+    jobs = [(path, os.path.relpath(path, data_dir)) for path in paths]
+    seen_files, seen_chunks = set(), set()
+
+    def unique(chunks):
+        for chunk in chunks:
+            key = text_hash(chunk["text"])
+            if key in seen_chunks:
+                progress.duplicates += 1
+                continue
+            seen_chunks.add(key)
+            progress.chunks += 1
+            yield chunk
+
+    pool = multiprocessing.Pool(workers) if workers > 1 and len(jobs) >= MIN_POOL_FILES else None
+    try:
+        results = pool.imap(parse_file, jobs, chunksize=4) if pool else map(parse_file, jobs)
+        for source, content_hash, chunks, error in results:
+            progress.files += 1
+            if error:
+                progress.failed += 1
+                print(f"[WARN] Skipped {source}: {error}")
+            elif content_hash in seen_files:
+                progress.duplicate_files += 1
+            else:
+                seen_files.add(content_hash)
+                yield from unique(chunks)
+            progress.report()
+        yield from unique(extra)
+    finally:
+        if pool:
+            pool.terminate()
+
+
+# Groups a chunk stream into batches of batch_size and encodes each one.
+def embed_batches(chunks, encode, batch_size=BATCH_SIZE, progress=None):
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            yield batch, encode([c["text"] for c in batch])
+            if progress:
+                progress.embedded += len(batch)
+            batch = []
+    if batch:
+        yield batch, encode([c["text"] for c in batch])
+        if progress:
+            progress.embedded += len(batch)
+
+
+if __name__ == "__main__":
+    import retrieval
+
+    parser = argparse.ArgumentParser(description="Parse, chunk, deduplicate and embed documents into an index artifact.")
+    parser.add_argument("--data-dir", default=retrieval.DATA_DIR)
+    parser.add_argument("--index-dir", help="default: index/<EMBED_BACKEND>")
+    parser.add_argument("--memory-file", default=retrieval.MEMORY_FILE, help='learned facts to include ("" for none)')
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(sys.argv[1:])
+    retriever = retrieval.Retriever(data_dir=args.data_dir, memory_file=args.memory_file or None,
+                                    index_dir=args.index_dir)
+    retriever.build(workers=args.workers, batch_size=args.batch_size)
+    print(f"[INFO] Index artifact written to {retriever.index_dir}")
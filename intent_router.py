@@ -0,0 +1,123 @@
+import re
+import random
+import threading
+from collections import namedtuple
+import numpy as np
+import metrics
+
+# ---------------- Config ----------------
+INTENT_THRESHOLD = 0.75  # min cosine to an intent centroid
+MAX_ROUTED_WORDS = 6     # longer messages are assumed to be real questions
+
+MEMORY_PATTERN = re.compile(r"^\s*(?:remember|learn)\s+that\b(.*)$", re.IGNORECASE | re.DOTALL)
+
+INTENT_EXAMPLES = {
+    "greeting": ["hi", "hello", "hey", "hi bro", "hey bro", "hello there", "good morning", "good evening", "namaste"],
+    "wellbeing": ["how are you", "hi how are you", "hello how are you", "hey how are you", "hey bro how are you",
+                  "how are you doing", "how is it going"],
+    "acknowledgement": ["ok", "okay", "nothing", "thanks", "thank you", "cool", "nice", "great", "got it", "fine"],
+    "farewell": ["bye", "goodbye", "see you", "good night", "see you later"],
+    "identity": ["who are you", "what is your name", "what are you", "what can you do", "what you can do",
+                 "what are you made for", "what do you know"],
+    "creator": ["who made you", "who created you", "who built you", "who developed you", "who is your creator"],
+}
+
+INTENT_REPLIES = {
+    "greeting": [
+        "Hey there! Ask me anything about GEHU Bhimtal campus.",
+        "Hello! What would you like to know about GEHU Bhimtal?",
+    ],
+    "wellbeing": [
+        "I'm doing great, thanks for asking! How can I help you with GEHU Bhimtal today?",
+        "All good here! What would you like to know about the campus?",
+    ],
+    "acknowledgement": [
+        "Alright! Let me know if you have any other question about the campus.",
+        "Sure thing. Anything else you'd like to know about GEHU Bhimtal?",
+    ],
+    "farewell": [
+        "Bye! Come back anytime you have questions about GEHU Bhimtal.",
+    ],
+    "identity": [
+        "I'm AlphaMind, the official assistant for Graphic Era Hill University, Bhimtal Campus. "
+        "I can help with admissions, courses, fees, hostels, placements, faculty and more.",
+    ],
+    "creator": [
+        "I was designed and built by Shankar Singh, a B.Tech CSE AIML student (Batch 2023–2027).",
+    ],
+}
+
+Route = namedtuple("Route", ["intent", "reply"])
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+# Answers greetings, small talk, identity questions and memory commands
+# without touching retrieval or the LLM. Exact phrase rules run first, then
+# nearest-centroid over the query vector the caller already computed for
+# retrieval, then any extra handlers (objects with a name and an
+# answer(query, query_vec) method returning a reply or None).
+# route() returns Route(intent, reply); reply None means "ask the LLM".
+class IntentRouter:
+    def __init__(self, encode, remember=None, handlers=(), threshold=INTENT_THRESHOLD, max_words=MAX_ROUTED_WORDS):
+        self.encode = encode
+        self.remember = remember
+        self.handlers = list(handlers)
+        self.threshold = threshold
+        self.max_words = max_words
+        self.phrases = {normalize(example): intent for intent, examples in INTENT_EXAMPLES.items() for example in examples}
+        self.intents = list(INTENT_EXAMPLES)
+        self.centroids = None
+        self.lock = threading.Lock()
+
+    def load_centroids(self):
+        with self.lock:
+            if self.centroids is None:
+                centroids = []
+                for intent in self.intents:
+                    centroid = self.encode(INTENT_EXAMPLES[intent]).mean(axis=0)
+                    centroids.append(centroid / np.linalg.norm(centroid))
+                self.centroids = np.stack(centroids).astype("float32")
+        return self.centroids
+
+    def classify(self, query, query_vec=None):
+        if MEMORY_PATTERN.match(query):
+            return "memory"
+        text = normalize(query)
+        if text in self.phrases:
+            return self.phrases[text]
+        if query_vec is None or not text or len(text.split()) > self.max_words:
+            return None
+        scores = self.load_centroids() @ np.asarray(query_vec).reshape(-1)
+        best = int(np.argmax(scores))
+        return self.intents[best] if scores[best] >= self.threshold else None
+
+    def route(self, query, query_vec=None):
+        intent = self.classify(query, query_vec)
+        if intent is None:
+            for handler in self.handlers:
+                reply = handler.answer(query, query_vec)
+                if reply:
+                    metrics.incr(f"intent.{handler.name}")
+                    return Route(handler.name, reply)
+        metrics.incr(f"intent.{intent or 'llm'}")
+        if intent is None:
+            return Route(None, None)
+        if intent == "memory":
+            return Route(intent, self.handle_memory(query))
+        return Route(intent, random.choice(INTENT_REPLIES[intent]))
+
+    def handle_memory(self, query):
+        fact = MEMORY_PATTERN.match(query).group(1).strip()
+        if not fact:
+            return "Please provide a fact after 'remember that'"
+        if self.remember is None:
+            return "Sorry, I can't learn new facts here."
+        try:
+            self.remember(fact)
+        except RuntimeError as e:
+            print(f"[WARN] Could not remember fact: {e}")
+            return "Sorry, I can't learn new facts here."
+        return f"Got it! I’ll remember: {fact}"
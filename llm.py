@@ -0,0 +1,370 @@
+import os
+import re
+import json
+import codecs
+import time
+import queue
+import socket
+import threading
+import subprocess
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import metrics
+
+# ---------------- Config ----------------
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+MODEL_NAME = "llama3.2"
+OLLAMA_TIMEOUT = 120
+LLM_PROCESS_TIMEOUT = 30
+LLM_FIRST_OUTPUT_TIMEOUT = float(os.environ.get("LLM_FIRST_OUTPUT_TIMEOUT", "10"))   # a CLI generator that has printed nothing by then is given up on
+POLL_INTERVAL = 0.2
+
+# ---------------- Generation Limits ----------------
+# Enforced on every backend, not just hinted in the prompt: Ollama's HTTP API
+# gets num_predict/stop natively, llama-run gets --n-predict, and for all of
+# them the output is cut after MAX_SENTENCES sentences or a stop sequence
+# (the CLI processes are killed at that point).
+MAX_TOKENS = 200
+MAX_SENTENCES = 3
+DETAILED_MAX_TOKENS = 512
+DETAILED_MAX_SENTENCES = None
+STOP_SEQUENCES = ["\nUser:", "\nBot:", "\nContext:", "\nConversation History:"]
+DETAIL_PATTERN = re.compile(
+    r"\b(in detail|detailed|details|elaborate|explain|step by step|full list|list all|everything about|"
+    r"tell me more|long answer)\b", re.IGNORECASE)
+ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "st", "no", "vs", "etc", "e.g", "i.e", "approx", "rs"}
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+LIST_NUMBER = re.compile(r"(^|\n)\s*\d+$")
+
+
+class Cancelled(Exception):
+    pass
+
+
+# Returned instead of a reply when the user stopped generation (Ctrl+C in
+# the CLIs): there is nothing to show, remember or log.
+CANCELLED = object()
+
+
+# Limits for one request. The user asking for detail (or the caller passing
+# detail=True) lifts the sentence cap and raises the token budget; explicit
+# max_tokens / max_sentences always win.
+def generation_options(query="", detail=None, max_tokens=None, max_sentences=None, stop=None):
+    if detail is None:
+        detail = DETAIL_PATTERN.search(query or "") is not None
+    return {
+        "max_tokens": max_tokens or (DETAILED_MAX_TOKENS if detail else MAX_TOKENS),
+        "max_sentences": max_sentences or (DETAILED_MAX_SENTENCES if detail else MAX_SENTENCES),
+        "stop": list(STOP_SEQUENCES if stop is None else stop),
+    }
+
+
+def sentence_ends(text):
+    for match in SENTENCE_END.finditer(text):
+        word = re.search(r"([\w.]+)$", text[:match.start()])
+        word = word.group(1).lower() if word else ""
+        # "Dr. Sharma" and the "1." of a numbered list do not end a sentence;
+        # "... is Rs. 50,000." does.
+        if word in ABBREVIATIONS or LIST_NUMBER.search(text[:match.start()]):
+            continue
+        yield match.end()
+
+
+# Splits streamed text into whole sentences as soon as each one is complete,
+# so speech synthesis can start before the reply is finished.
+class SentenceBuffer:
+    def __init__(self):
+        self.text = ""
+        self.sent = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        sentences = []
+        for end in sentence_ends(self.text):
+            if end > self.sent:
+                sentences.append(self.text[self.sent:end].strip())
+                self.sent = end
+        return [sentence for sentence in sentences if sentence]
+
+    def flush(self):
+        rest, self.sent = self.text[self.sent:].strip(), len(self.text)
+        return [rest] if rest else []
+
+
+# Cuts a stream of text at the first stop sequence, after max_sentences
+# sentences or (when count_tokens is set, for backends that cannot enforce
+# it themselves) after roughly max_tokens tokens. Text that could be the
+# start of a stop sequence is held back until it is known not to be one.
+class OutputLimiter:
+    def __init__(self, options, count_tokens=False):
+        self.max_tokens = options.get("max_tokens") if count_tokens else None
+        self.max_sentences = options.get("max_sentences")
+        self.stop = [s for s in options.get("stop") or [] if s]
+        self.holdback = max((len(s) for s in self.stop), default=1) - 1
+        self.text = ""
+        self.sent = 0
+        self.done = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        cut = None
+        for stop in self.stop:
+            index = self.text.find(stop)
+            if index >= 0 and (cut is None or index < cut):
+                cut = index
+        if self.max_sentences:
+            for count, end in enumerate(sentence_ends(self.text[:cut]), 1):
+                if count == self.max_sentences:
+                    cut = end
+                    break
+        if cut is None and self.max_tokens and len(self.text.split()) * 4 // 3 >= self.max_tokens:
+            cut = len(self.text)
+        if cut is not None:
+            self.done = True
+            return self.take(cut)
+        return self.take(len(self.text) - self.holdback)
+
+    def flush(self):
+        return self.take(len(self.text))
+
+    def take(self, end):
+        if end <= self.sent:
+            return ""
+        text, self.sent = self.text[self.sent:end], end
+        return text
+
+
+def limit_output(chunks, options, count_tokens=False):
+    limiter = OutputLimiter(options, count_tokens)
+    for chunk in chunks:
+        text = limiter.feed(chunk)
+        if text:
+            yield text
+        if limiter.done:
+            metrics.incr("llm.truncated")
+            return  # the caller closes the source, which stops generation
+    text = limiter.flush()
+    if text:
+        yield text
+
+
+def ollama_payload(prompt, model, stream, options):
+    return {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "options": {"num_predict": options["max_tokens"], "stop": options["stop"]},
+    }
+
+
+# session lets callers that issue many requests (the batch job, the servers)
+# keep a pooled keep-alive connection per thread instead of reconnecting.
+def query_ollama(prompt, session=None, model=MODEL_NAME, url=OLLAMA_URL, timeout=OLLAMA_TIMEOUT, options=None):
+    options = options or generation_options()
+    response = (session or requests).post(url, json=ollama_payload(prompt, model, False, options), timeout=timeout)
+    response.raise_for_status()
+    return "".join(limit_output([response.json()["response"]], options)).strip()
+
+
+# Yields the reply as Ollama generates it, one text fragment at a time.
+# Setting the cancel event closes the connection, even while Ollama has not
+# answered yet (request queued, model loading), which makes it drop the
+# request and start the next queued one. Pass a cancellable_session() as
+# session; other sessions are only checked between fragments.
+def stream_ollama(prompt, session=None, model=MODEL_NAME, url=OLLAMA_URL, timeout=OLLAMA_TIMEOUT, cancel=None,
+                  options=None):
+    options = options or generation_options()
+    try:
+        with CancelWatch(cancel):
+            with (session or cancellable_session()).post(url, json=ollama_payload(prompt, model, True, options),
+                                                         stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                yield from limit_output(read_ollama_stream(response, cancel), options)
+    except requests.RequestException:
+        if cancel is None or not cancel.is_set():
+            raise
+        metrics.incr("llm.cancelled")  # the watch closed the connection under us
+
+
+def read_ollama_stream(response, cancel):
+    for line in response.iter_lines():
+        if cancel is not None and cancel.is_set():
+            metrics.incr("llm.cancelled")
+            return
+        if not line:
+            continue
+        part = json.loads(line)
+        if part.get("response"):
+            yield part["response"]
+        if part.get("done"):
+            return
+
+
+# ---------------- Cancellation ----------------
+# Ollama sends nothing until a request has a slot and its first token, so
+# checking cancel between lines keeps an abandoned request queued or loading
+# (and counted as outstanding) until then. Connections of a
+# cancellable_session() attach themselves to the CancelWatch of the thread
+# that sends on them, and the watch shuts the socket down once cancel is
+# set: the blocked read returns and Ollama sees the client hang up.
+watched = threading.local()
+
+
+class CancellableRequests:
+    def request(self, *args, **kwargs):
+        watch = getattr(watched, "watch", None)
+        if watch is not None:
+            watch.attach(self)
+        return super().request(*args, **kwargs)
+
+
+class CancellableConnection(CancellableRequests, HTTPConnection):
+    pass
+
+
+class CancellableHTTPSConnection(CancellableRequests, HTTPSConnection):
+    pass
+
+
+class CancellableConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CancellableConnection
+
+
+class CancellableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CancellableHTTPSConnection
+
+
+class CancellableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CancellableConnectionPool,
+                                                   "https": CancellableHTTPSConnectionPool}
+
+
+def cancellable_session():
+    session = requests.Session()
+    adapter = CancellableAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Watches one request: the first connection used on this thread inside the
+# with block. Once the block exits the connection is back in the pool and is
+# never touched again, so a late cancel cannot cut another request.
+class CancelWatch:
+    def __init__(self, cancel):
+        self.cancel = cancel
+        self.connection = None
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        if self.cancel is not None:
+            watched.watch = self
+            threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        watched.watch = None
+        with self.lock:
+            self.connection = None
+            self.finished = True
+
+    def attach(self, connection):
+        watched.watch = None
+        with self.lock:
+            self.connection = connection
+
+    def run(self):
+        while not self.cancel.wait(POLL_INTERVAL):
+            if self.finished:
+                return
+        # Keep at it until the request ends: the socket may not be open yet.
+        while True:
+            with self.lock:
+                if self.finished:
+                    return
+                sock = self.connection.sock if self.connection is not None else None
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            time.sleep(POLL_INTERVAL)
+
+
+# Runs a CLI generator (`ollama run`, llama-run) and kills it on timeout,
+# on cancel or on Ctrl+C instead of leaving it generating in the background.
+# first_timeout bounds the wait for its first output, so a stuck or
+# overloaded model is given up on (and the caller can fall back) long
+# before timeout. With options, stdout is read as it is produced and the
+# process is also killed once the output limits are reached; only the kept
+# text is returned.
+def run_llm_process(args, prompt=None, timeout=LLM_PROCESS_TIMEOUT, cancel=None, options=None,
+                    first_timeout=LLM_FIRST_OUTPUT_TIMEOUT):
+    process = subprocess.Popen(args, stdin=subprocess.PIPE if prompt is not None else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, errors = queue.Queue(), queue.Queue()
+    threading.Thread(target=pump, args=(process.stdout, output), daemon=True).start()
+    threading.Thread(target=pump, args=(process.stderr, errors), daemon=True).start()
+    limiter = OutputLimiter(options, count_tokens=True) if options else None
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    first_deadline = time.monotonic() + first_timeout if first_timeout is not None else None
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    stdout = []
+    try:
+        if prompt is not None:
+            process.stdin.write(prompt.encode("utf-8"))
+            process.stdin.close()
+        while True:
+            try:
+                chunk = output.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                chunk = b""
+            if chunk is None:
+                break
+            if chunk:
+                first_deadline = None
+                text = decoder.decode(chunk)
+                stdout.append(limiter.feed(text) if limiter else text)
+                if limiter and limiter.done:
+                    metrics.incr("llm.truncated")
+                    stop_process(process)
+                    return subprocess.CompletedProcess(args, 0, "".join(stdout).encode("utf-8"), b"")
+            if cancel is not None and cancel.is_set():
+                metrics.incr("llm.cancelled")
+                raise Cancelled("generation cancelled")
+            if deadline is not None and time.monotonic() >= deadline:
+                metrics.incr("llm.timeout")
+                raise subprocess.TimeoutExpired(args, timeout)
+            if first_deadline is not None and time.monotonic() >= first_deadline:
+                metrics.incr("llm.timeout")
+                raise subprocess.TimeoutExpired(args, first_timeout)
+        process.wait()
+        if limiter:
+            stdout.append(limiter.flush())
+        stderr = b"".join(iter(errors.get, None))
+        return subprocess.CompletedProcess(args, process.returncode, "".join(stdout).encode("utf-8"), stderr)
+    except BaseException:
+        stop_process(process)
+        raise
+
+
+# Incremental reads need a thread per pipe; None marks end of output.
+def pump(stream, output):
+    try:
+        for chunk in iter(lambda: stream.read1(4096), b""):
+            output.put(chunk)
+    except (OSError, ValueError):
+        pass
+    output.put(None)
+
+
+# The pipes are left to the pump threads: closing one while a pump is
+# blocked reading it would wait for the read to return.
+def stop_process(process):
+    process.kill()
+    process.wait()
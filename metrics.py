@@ -0,0 +1,17 @@
+import threading
+from collections import Counter
+
+# Process-wide counters shared by the routers, backends and servers.
+# Servers expose snapshot() (e.g. app.py's /metrics endpoint).
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
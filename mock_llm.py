@@ -0,0 +1,330 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import select
+import socket
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline stand-ins for the model backends, for benchmarks without a model:
+#   python mock_llm.py serve --profile cpu --port 11434     # Ollama HTTP API (/api/generate, /api/tags)
+#   PATH=$PWD/mock_bin:$PATH python OllamaBackend.py         # `ollama run` stub
+#   LLAMA_RUN=mock_bin/llama-run python CppBackend.py        # llama-run stub
+#
+# Replies are built from the prompt's Context section, so they are
+# deterministic and still look like answers. Every latency knob comes from a
+# profile; command-line flags (server) or MOCK_* variables (stubs, server)
+# override single values.
+
+# ---------------- Profiles ----------------
+# load_delay: first request for a model (and every llama-run call)
+# ttft: time to first token once a slot is free; tps: tokens per second after it
+# parallel / max_queue: like OLLAMA_NUM_PARALLEL / OLLAMA_MAX_QUEUE (503 when full)
+# fail_rate: requests answered with HTTP 500 (or exit 1); drop_rate: streams cut mid-reply
+PROFILES = {
+    "instant": {"load_delay": 0.0, "ttft": 0.0, "tps": 0, "reply_tokens": 40, "parallel": 64, "max_queue": 512,
+                "fail_rate": 0.0, "drop_rate": 0.0},
+    "gpu": {"load_delay": 2.0, "ttft": 0.15, "tps": 60, "reply_tokens": 60, "parallel": 4, "max_queue": 512,
+            "fail_rate": 0.0, "drop_rate": 0.0},
+    "cpu": {"load_delay": 6.0, "ttft": 1.2, "tps": 9, "reply_tokens": 60, "parallel": 1, "max_queue": 512,
+            "fail_rate": 0.0, "drop_rate": 0.0},
+    "flaky": {"load_delay": 2.0, "ttft": 0.5, "tps": 20, "reply_tokens": 60, "parallel": 2, "max_queue": 16,
+              "fail_rate": 0.1, "drop_rate": 0.1},
+}
+DEFAULT_PROFILE = os.environ.get("MOCK_PROFILE", "gpu")
+HANGUP_POLL = 0.1   # seconds between checks for a client that left while queued or waiting
+SEED = int(os.environ.get("MOCK_SEED", "0"))
+FILLER = ("The campus office can help with that. Please check the notice board or the official website "
+          "for the latest details.")
+
+
+def load_profile(name=DEFAULT_PROFILE, **overrides):
+    profile = dict(PROFILES[name])
+    for key, value in profile.items():
+        env = os.environ.get(f"MOCK_{key.upper()}")
+        if env is not None:
+            profile[key] = type(value)(env)
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+    return profile
+
+
+def mock_reply(prompt, tokens):
+    context = prompt.split("Context:", 1)[1].split("\nUser:", 1)[0] if "Context:" in prompt else ""
+    words = re.sub(r"[#*`|>-]+", " ", context).split() or FILLER.split()
+    reply = [words[i % len(words)] for i in range(max(tokens, 1))]
+    if not reply[-1].endswith((".", "!", "?")):
+        reply[-1] += "."
+    return [word if i == 0 else " " + word for i, word in enumerate(reply)]
+
+
+# Same prompt, same request number, same seed: same decision.
+def chance(rate, *keys):
+    if rate <= 0:
+        return False
+    digest = hashlib.sha256(repr((SEED,) + keys).encode("utf-8")).digest()
+    return random.Random(digest).random() < rate
+
+
+def apply_stop(tokens, stop):
+    text = ""
+    for count, token in enumerate(tokens):
+        text += token
+        if any(s and s in text for s in stop or []):
+            return tokens[:count], True
+    return tokens, False
+
+
+# ---------------- Ollama HTTP API ----------------
+class MockOllama:
+    def __init__(self, profile):
+        self.profile = profile
+        self.slots = threading.Semaphore(profile["parallel"])
+        self.lock = threading.Lock()
+        self.loaded = {}      # model -> Event set once its load delay has passed
+        self.waiting = 0
+        self.requests = 0
+        self.stats = Counter()
+
+    def admit(self):
+        with self.lock:
+            if self.waiting >= self.profile["max_queue"]:
+                self.stats["rejected"] += 1
+                return None
+            self.waiting += 1
+            self.requests += 1
+            self.stats["requests"] += 1
+            return self.requests
+
+    def load(self, model):
+        with self.lock:
+            event = self.loaded.get(model)
+            owner = event is None
+            if owner:
+                event = self.loaded[model] = threading.Event()
+        if owner:
+            time.sleep(self.profile["load_delay"])
+            event.set()
+            return self.profile["load_delay"]
+        event.wait()
+        return 0.0
+
+    # Yields tokens at the profile's pace; the caller holds a slot meanwhile.
+    # wait(seconds) sleeps until the first token and may raise to abort.
+    def generate(self, prompt, options, wait=time.sleep):
+        tokens = mock_reply(prompt, min(self.profile["reply_tokens"], options.get("num_predict") or 10 ** 6))
+        tokens, stopped = apply_stop(tokens, options.get("stop"))
+        wait(self.profile["ttft"])
+        for token in tokens:
+            yield token
+            if self.profile["tps"]:
+                time.sleep(1 / self.profile["tps"])
+
+    def snapshot(self):
+        with self.lock:
+            return {**self.stats, "waiting": self.waiting, "loaded": sorted(self.loaded)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json(200, {"models": [{"name": name} for name in self.mock.snapshot()["loaded"]]})
+        elif self.path == "/mock/stats":
+            self.send_json(200, self.mock.snapshot())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            return self.send_json(404, {"error": "not found"})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        number = self.mock.admit()
+        if number is None:
+            return self.send_json(503, {"error": "server busy, please try again.  maximum pending requests exceeded"})
+        start = time.perf_counter()  # queueing counts towards time to first token, as in Ollama
+        # Like Ollama, a client that hangs up while queued gives up its place.
+        while not self.mock.slots.acquire(timeout=HANGUP_POLL):
+            if self.client_gone():
+                with self.mock.lock:
+                    self.mock.waiting -= 1
+                    self.mock.stats["cancelled"] += 1
+                self.close_connection = True
+                return
+        with self.mock.lock:
+            self.mock.waiting -= 1
+            self.mock.stats["active"] += 1
+        try:
+            self.answer(body, number, start)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client hung up: stop generating and free the slot, like Ollama does
+            with self.mock.lock:
+                self.mock.stats["cancelled"] += 1
+            self.close_connection = True
+        finally:
+            with self.mock.lock:
+                self.mock.stats["active"] -= 1
+            self.mock.slots.release()
+
+    def client_gone(self):
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    # Sleeps until the first token, giving up as soon as the client leaves.
+    def wait_first_token(self, seconds):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            time.sleep(min(HANGUP_POLL, max(end - time.monotonic(), 0)))
+            if self.client_gone():
+                raise ConnectionResetError("client hung up before the first token")
+
+    def answer(self, body, number, start):
+        model, prompt = body.get("model", "mock"), body.get("prompt", "")
+        options = body.get("options") or {}
+        load_duration = self.mock.load(model)
+        if chance(self.mock.profile["fail_rate"], "fail", prompt, number):
+            with self.mock.lock:
+                self.mock.stats["failed"] += 1
+            return self.send_json(500, {"error": "mock failure"})
+        drop = chance(self.mock.profile["drop_rate"], "drop", prompt, number)
+        tokens = self.mock.generate(prompt, options, self.wait_first_token)
+
+        if not body.get("stream", True):
+            text = "".join(tokens)
+            self.send_json(200, self.final(model, text, start, load_duration, len(text.split())))
+            with self.mock.lock:
+                self.mock.stats["completed"] += 1
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        count = 0
+        for token in tokens:
+            self.write_chunk({"model": model, "created_at": now(), "response": token, "done": False})
+            count += 1
+            if drop and count >= 3:
+                with self.mock.lock:
+                    self.mock.stats["dropped"] += 1
+                self.close_connection = True
+                return  # no terminating chunk: the client sees a broken stream
+        self.write_chunk(self.final(model, "", start, load_duration, count))
+        self.wfile.write(b"0\r\n\r\n")
+        with self.mock.lock:
+            self.mock.stats["completed"] += 1
+
+    def write_chunk(self, part):
+        data = (json.dumps(part) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def final(self, model, text, start, load_duration, count):
+        return {"model": model, "created_at": now(), "response": text, "done": True, "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - start) * 1e9), "load_duration": int(load_duration * 1e9),
+                "eval_count": count}
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def serve(profile, host="127.0.0.1", port=11434):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.mock = MockOllama(profile)
+    print(f"[INFO] Mock Ollama on http://{host}:{port}/api/generate with {profile}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ---------------- CLI stubs ----------------
+# `ollama run MODEL [PROMPT]` reads the prompt from stdin like the real CLI
+# and talks to a warm server, so it pays only the time to first token.
+# `llama-run MODEL PROMPT --n-predict=N` loads the model on every call.
+def run_cli(prompt, tokens, profile, load=False):
+    if load:
+        time.sleep(profile["load_delay"])
+    if chance(profile["fail_rate"], "fail", prompt, os.getpid()):
+        print("Error: mock failure", file=sys.stderr)
+        return 1
+    time.sleep(profile["ttft"])
+    for token in mock_reply(prompt, min(profile["reply_tokens"], tokens)):
+        sys.stdout.write(token)
+        sys.stdout.flush()
+        if profile["tps"]:
+            time.sleep(1 / profile["tps"])
+    sys.stdout.write("\n")
+    return 0
+
+
+def ollama_cli(args, profile):
+    if len(args) < 2 or args[0] != "run":
+        print("Usage: ollama run MODEL [PROMPT]", file=sys.stderr)
+        return 1
+    prompt = " ".join(args[2:]) if len(args) > 2 else sys.stdin.read()
+    return run_cli(prompt, 10 ** 6, profile)
+
+
+def llama_run_cli(args, profile):
+    n_predict, positional = 10 ** 6, []
+    for i, arg in enumerate(args):
+        if arg.startswith("--n-predict="):
+            n_predict = int(arg.split("=", 1)[1])
+        elif arg in ("-n", "--n-predict") and i + 1 < len(args):
+            n_predict = int(args[i + 1])
+        elif not arg.startswith("-") and not (i and args[i - 1] in ("-n", "--n-predict")):
+            positional.append(arg)
+    if not positional:
+        print("Usage: llama-run MODEL [PROMPT] [--n-predict=N]", file=sys.stderr)
+        return 1
+    prompt = " ".join(positional[1:]) if len(positional) > 1 else sys.stdin.read()
+    return run_cli(prompt, n_predict if n_predict > 0 else 10 ** 6, profile, load=True)
+
+
+if __name__ == "__main__":
+    command, rest = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("serve", [])
+    if command == "ollama":
+        sys.exit(ollama_cli(rest, load_profile()))
+    if command == "llama-run":
+        sys.exit(llama_run_cli(rest, load_profile()))
+    if command != "serve":
+        print("Usage: python mock_llm.py [serve [options] | ollama run MODEL | llama-run MODEL PROMPT]")
+        sys.exit(1)
+    parser = argparse.ArgumentParser(prog="mock_llm.py serve", description="Ollama-compatible mock server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE)
+    for key, value in PROFILES["gpu"].items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value))
+    args = parser.parse_args(rest)
+    serve(load_profile(args.profile, **{key: getattr(args, key) for key in PROFILES["gpu"]}), args.host, args.port)
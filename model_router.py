@@ -0,0 +1,139 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import metrics
+from llm import MODEL_NAME
+
+# ---------------- Config ----------------
+# Short lookups with a confident retrieval hit go to the small model; long,
+# open-ended or poorly grounded questions go to the large one. Routing is
+# opt-in: set SMALL_MODEL (e.g. llama3.2:1b) once that model is pulled,
+# otherwise every request for it would fail with a 404.
+SMALL_MODEL = os.environ.get("SMALL_MODEL", "")
+LARGE_MODEL = os.environ.get("LARGE_MODEL", MODEL_NAME)
+SMALL_MODEL_PATH = "models/Llama-3.2-1B-Instruct-Q4_K_M.gguf"
+LARGE_MODEL_PATH = "models/Llama-3.2-3B-Instruct-Q4_K_M.gguf"
+# The thresholds the benchmark below tunes (--max-words / --min-score) are
+# applied by the servers through MAX_SMALL_WORDS / MIN_SMALL_SCORE.
+MAX_SMALL_WORDS = int(os.environ.get("MAX_SMALL_WORDS", "12"))        # longer questions go to the large model
+MIN_SMALL_SCORE = float(os.environ.get("MIN_SMALL_SCORE", "0.55"))    # top retrieval cosine needed for the small model
+
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(why|explain|describe|compare|comparison|difference|differences|versus|vs|pros|cons|advantages|"
+    r"disadvantages|better|best|should i|recommend|suggest|opinion|in detail|elaborate|tell me about|"
+    r"how does|how do|how can)\b", re.IGNORECASE)
+
+BENCH_QUESTIONS = [
+    "What is the hostel fee?",
+    "Who is the HOD of CSE?",
+    "What is the admission email id?",
+    "Does GEHU Bhimtal have a library?",
+    "Explain the placement process at GEHU Bhimtal.",
+    "Should I choose BCA or B.Tech CSE?",
+    "Tell me about campus life and clubs.",
+    "Why is Bhimtal campus good for engineering?",
+]
+
+
+# Picks "small" or "large" for a question from signals that are already
+# computed before generation: word count, wording and the retrieval scores.
+class ModelRouter:
+    def __init__(self, small=SMALL_MODEL, large=LARGE_MODEL, max_words=MAX_SMALL_WORDS, min_score=MIN_SMALL_SCORE):
+        self.models = {"small": small, "large": large}
+        self.max_words = max_words
+        self.min_score = min_score
+
+    def choose(self, query, hits):
+        if not self.models["small"] or not hits:
+            return "large"
+        if len(query.split()) > self.max_words or OPEN_ENDED_PATTERN.search(query):
+            return "large"
+        return "small" if hits[0]["score"] >= self.min_score else "large"
+
+    def model(self, route):
+        return self.models[route]
+
+    def record(self, route, seconds):
+        metrics.incr(f"model.{route}.requests")
+        metrics.incr(f"model.{route}.total_ms", round(seconds * 1000))
+
+    @staticmethod
+    def stats(snapshot=None):
+        snapshot = snapshot if snapshot is not None else metrics.snapshot()
+        stats = {}
+        for route in ("small", "large"):
+            requests = snapshot.get(f"model.{route}.requests", 0)
+            if requests:
+                stats[route] = {"requests": requests,
+                                "avg_ms": round(snapshot[f"model.{route}.total_ms"] / requests, 1)}
+        return stats
+
+
+# ---------------- Benchmark ----------------
+# Answers every question with the routed model and with the large model and
+# reports latency for both policies. Quality is measured as the cosine
+# between the routed answer and the large model's answer (1.0 when the
+# large model was routed anyway), and against a reference answer when the
+# input file has one.
+def bench(questions, router=None, k=3):
+    from retrieval import get_retriever, format_context
+    from llm import query_ollama
+    from prompts import build_prompt
+
+    router = router or ModelRouter()
+    if not router.model("small"):
+        print("[WARN] SMALL_MODEL is not set; every question goes to the large model")
+    retriever = get_retriever()
+    rows = []
+    for item in questions:
+        hits = retriever.retrieve(item["question"], k)
+        prompt = build_prompt(item["question"], format_context(hits))
+        route = router.choose(item["question"], hits)
+        start = time.perf_counter()
+        large_answer = query_ollama(prompt, model=router.model("large"))
+        large_ms = (time.perf_counter() - start) * 1000
+        if route == "small":
+            start = time.perf_counter()
+            answer = query_ollama(prompt, model=router.model("small"))
+            routed_ms = (time.perf_counter() - start) * 1000
+        else:
+            answer, routed_ms = large_answer, large_ms
+        vectors = retriever.encode([answer, large_answer] + ([item["reference"]] if item.get("reference") else []))
+        row = {"question": item["question"], "route": route, "routed_ms": routed_ms, "large_ms": large_ms,
+               "agreement": float(vectors[0] @ vectors[1])}
+        if len(vectors) > 2:
+            row["routed_ref"] = float(vectors[0] @ vectors[2])
+            row["large_ref"] = float(vectors[1] @ vectors[2])
+        rows.append(row)
+        print(f"[{route:>5}] {routed_ms:7.0f} ms vs {large_ms:7.0f} ms  agreement {row['agreement']:.3f}  {item['question']}")
+
+    small = [row for row in rows if row["route"] == "small"]
+    print(f"\n[INFO] {len(small)}/{len(rows)} questions routed to {router.model('small')}")
+    print(f"[INFO] mean latency: routed {np.mean([r['routed_ms'] for r in rows]):.0f} ms, "
+          f"always-{router.model('large')} {np.mean([r['large_ms'] for r in rows]):.0f} ms")
+    if small:
+        print(f"[INFO] small-model answers: mean agreement with large {np.mean([r['agreement'] for r in small]):.3f}, "
+              f"min {min(r['agreement'] for r in small):.3f}")
+    referenced = [row for row in rows if "routed_ref" in row]
+    if referenced:
+        print(f"[INFO] similarity to reference answers: routed {np.mean([r['routed_ref'] for r in referenced]):.3f}, "
+              f"always-large {np.mean([r['large_ref'] for r in referenced]):.3f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare routed small/large generation against always-large.")
+    parser.add_argument("questions", nargs="?", help="JSONL file (question, optional reference); default: built-in set")
+    parser.add_argument("--max-words", type=int, default=MAX_SMALL_WORDS)
+    parser.add_argument("--min-score", type=float, default=MIN_SMALL_SCORE)
+    args = parser.parse_args(sys.argv[1:])
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [json.loads(line) for line in f if line.strip()]
+    else:
+        questions = [{"question": question} for question in BENCH_QUESTIONS]
+    bench(questions, ModelRouter(max_words=args.max_words, min_score=args.min_score))
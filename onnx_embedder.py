@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import numpy as np
+from startup import timed
+
+# ---------------- Config ----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBED_MODEL_PATH = os.path.join(BASE_DIR, "embedding_models", "all-MiniLM-L6-v2")
+ONNX_DIR = "onnx"
+ONNX_MODEL = "model.onnx"
+ONNX_MODEL_INT8 = "model_int8.onnx"
+MAX_SEQ_LENGTH = 256  # from sentence_bert_config.json
+BATCH_SIZE = 32
+
+BENCH_QUERIES = [
+    "What are the hostel facilities at GEHU Bhimtal?",
+    "Who is the HOD of the CSE department?",
+    "Can you list some clubs available on campus?",
+    "Tell me about the placement statistics.",
+    "What is the hostel fee?",
+    "Does GEHU Bhimtal offer scholarships?",
+]
+
+
+def onnx_path(model_path=EMBED_MODEL_PATH, quantized=False):
+    return os.path.join(model_path, ONNX_DIR, ONNX_MODEL_INT8 if quantized else ONNX_MODEL)
+
+
+# ---------------- Runtime (no torch) ----------------
+# Mirrors the SentenceTransformer pipeline of all-MiniLM-L6-v2
+# (Transformer -> mean pooling -> Normalize) using only tokenizers,
+# onnxruntime and numpy, and exposes the same encode() call.
+class OnnxEmbedder:
+    def __init__(self, model_path=EMBED_MODEL_PATH, quantized=False, threads=None):
+        with timed("import onnxruntime"):
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        # tokenizer.json pads everything to a fixed 128; pad per batch instead
+        # and truncate at the model's real limit like sentence-transformers does.
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        path = onnx_path(model_path, quantized)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run `python onnx_embedder.py export` first")
+        with timed("load onnx session"):
+            self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=BATCH_SIZE):
+        if isinstance(texts, str):
+            texts = [texts]
+        batches = [self.encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        vectors = np.concatenate(batches) if batches else np.zeros((0, 384), dtype="float32")
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.clip(norms, 1e-12, None)
+        return vectors.astype("float32")
+
+    def encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype="int64")
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype="int64")
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype("float32")
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+# ---------------- Export (one-off, needs torch) ----------------
+def export(model_path=EMBED_MODEL_PATH, quantize=True):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(os.path.join(model_path, ONNX_DIR), exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    print(f"[INFO] Exporting {onnx_path(model_path)}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            onnx_path(model_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=17,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"[INFO] Quantizing to {onnx_path(model_path, quantized=True)}...")
+        quantize_dynamic(onnx_path(model_path), onnx_path(model_path, quantized=True), weight_type=QuantType.QInt8)
+
+
+# ---------------- Parity + Benchmark ----------------
+def load_reference(model_path=EMBED_MODEL_PATH):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_path)
+
+
+def parity(model_path=EMBED_MODEL_PATH, texts=None):
+    from retrieval import load_documents
+    texts = texts or BENCH_QUERIES + [chunk["text"] for chunk in load_documents()]
+    reference = load_reference(model_path).encode(texts, normalize_embeddings=True)
+    for quantized in (False, True):
+        if not os.path.exists(onnx_path(model_path, quantized)):
+            continue
+        vectors = OnnxEmbedder(model_path, quantized).encode(texts)
+        cosine = (reference * vectors).sum(axis=1)
+        label = "int8" if quantized else "fp32"
+        print(f"[INFO] {label}: min cosine {cosine.min():.5f}, mean cosine {cosine.mean():.5f} over {len(texts)} texts")
+
+
+def bench(model_path=EMBED_MODEL_PATH, rounds=50):
+    backends = [("torch", load_reference(model_path))]
+    for quantized in (False, True):
+        if os.path.exists(onnx_path(model_path, quantized)):
+            backends.append(("onnx int8" if quantized else "onnx fp32", OnnxEmbedder(model_path, quantized)))
+    for label, model in backends:
+        model.encode(BENCH_QUERIES[:1], normalize_embeddings=True)
+        start = time.perf_counter()
+        for i in range(rounds):
+            model.encode([BENCH_QUERIES[i % len(BENCH_QUERIES)]], normalize_embeddings=True)
+        per_query = (time.perf_counter() - start) / rounds
+        print(f"[INFO] {label:<10} {per_query * 1000:7.2f} ms/query")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if command == "export":
+        export(quantize="--no-quantize" not in sys.argv)
+    elif command == "parity":
+        parity()
+    elif command == "bench":
+        bench()
+    else:
+        print("Usage: python onnx_embedder.py [export [--no-quantize] | parity | bench]")
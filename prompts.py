@@ -0,0 +1,21 @@
+# The campus assistant prompt shared by the API server and the offline jobs
+# (batch answers, the FAQ bank, the model benchmark), so answers generated
+# offline read like live ones. history=None leaves out the conversation
+# section, for questions asked outside a conversation.
+def build_prompt(query, context, history=None):
+    history_section = f"Conversation History:\n{history}\n\n" if history is not None else ""
+    return f"""You are a helpful college assistant at Graphic Era Hill University, Bhimtal Campus.
+
+📌 Communication Guidelines:
+"tone": "friendly"
+"tone": "talkative"
+"tone": "humorous"
+- Keep replies short and natural — 1–2 sentences unless asked otherwise.
+- Speak conversationally like a real person.
+- Don't invent facts.
+
+{history_section}Context:
+{context}
+
+User: {query}
+Answer:"""
@@ -0,0 +1,408 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import hashlib
+import threading
+import numpy as np
+import ingest
+import metrics
+from startup import timed
+
+# ---------------- Config ----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "college_data")
+MEMORY_FILE = os.path.join(BASE_DIR, "memory.txt")
+EMBED_MODEL_PATH = os.path.join(BASE_DIR, "embedding_models", "all-MiniLM-L6-v2")
+# Each embedding backend gets its own artifact under INDEX_DIR/<backend>, so
+# entry points using different backends never rebuild each other's index.
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (see onnx_embedder.py).
+# The ONNX backends never import torch, which keeps the API server small.
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+# Intra-op threads per ONNX session (0 = ONNX Runtime's default, every core).
+# gunicorn.conf.py sets 1, since each worker already has a core of its own.
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))
+# Multi-worker deployments set RETRIEVER_MMAP=1 so every worker maps the same
+# read-only artifact instead of holding its own copy of the index.
+MMAP_INDEX = os.environ.get("RETRIEVER_MMAP") == "1"
+INDEX_FILE = "docs.faiss"
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunk_offsets.npy"
+MANIFEST_FILE = "manifest.json"
+# Each save writes a new version directory and then swaps CURRENT_FILE, which
+# names the live one. Files of a published version are never rewritten, so
+# processes that mapped them keep reading the old inodes.
+CURRENT_FILE = "current"
+KEEP_VERSIONS = 2
+
+# Every entry point searches the same artifact, so the metric is fixed here:
+# unit-length vectors with inner product, i.e. cosine similarity.
+METRIC = "ip"
+INDEX_TYPES = {
+    "ip": "IndexFlatIP",
+    "l2": "IndexFlatL2",
+}
+
+# Adaptive k: search ADAPTIVE_MAX_K candidates, then keep only the ones worth
+# putting in the prompt (see select_hits).
+ADAPTIVE_MAX_K = 5
+MIN_CONTEXT_SCORE = 0.25   # below this a chunk is unrelated (small talk scores ~0.1)
+RELATIVE_SCORE = 0.8       # keep chunks scoring at least this fraction of the best one
+SUFFICIENT_SCORE = 0.7     # a top chunk this good ...
+SUFFICIENT_GAP = 0.1       # ... and this far ahead of the next one is used alone
+
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+# faiss and sentence_transformers (which pulls in torch) dominate import time,
+# so they are only imported once an index or the model is actually needed.
+def import_faiss():
+    with timed("import faiss"):
+        import faiss
+    return faiss
+
+
+def import_sentence_transformers():
+    with timed("import sentence_transformers"):
+        from sentence_transformers import SentenceTransformer
+    return SentenceTransformer
+
+
+# ---------------- Documents ----------------
+# Every format with an extractor in ingest.py (.txt, .md, .html, .pdf).
+def load_documents(path=DATA_DIR, workers=1):
+    return list(ingest.iter_chunks(path, workers=workers))
+
+
+def load_memory(memory_file=MEMORY_FILE):
+    if memory_file and os.path.exists(memory_file):
+        with open(memory_file, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return []
+
+
+def save_memory_line(line, memory_file=MEMORY_FILE):
+    with open(memory_file, "a", encoding="utf-8") as f:
+        f.write(line.strip() + "\n")
+
+
+# Content hash per chunk source, keyed like chunk["source"]: the path relative
+# to data_dir, plus "memory" for the learned-facts file.
+def source_hashes(data_dir=DATA_DIR, memory_file=MEMORY_FILE):
+    hashes = {os.path.relpath(path, data_dir): ingest.file_hash(path) for path in ingest.list_sources(data_dir)}
+    if memory_file and os.path.exists(memory_file):
+        with open(memory_file, "rb") as f:
+            hashes["memory"] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def corpus_fingerprint(data_dir=DATA_DIR, memory_file=MEMORY_FILE):
+    digest = hashlib.sha256()
+    for source, content_hash in source_hashes(data_dir, memory_file).items():
+        digest.update(source.encode("utf-8"))
+        digest.update(content_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
+def format_context(hits):
+    return "\n---\n".join([hit["text"] for hit in hits])
+
+
+# Picks how many of the score-ordered hits go into the prompt. Returns an
+# empty list when nothing is relevant, so the prompt carries no context.
+def select_hits(hits, min_score=MIN_CONTEXT_SCORE, relative=RELATIVE_SCORE,
+                sufficient=SUFFICIENT_SCORE, gap=SUFFICIENT_GAP):
+    hits = [hit for hit in hits if hit["score"] >= min_score]
+    if not hits:
+        return []
+    best = hits[0]["score"]
+    if best >= sufficient and (len(hits) == 1 or best - hits[1]["score"] >= gap):
+        return hits[:1]
+    return [hit for hit in hits if hit["score"] >= best * relative]
+
+
+# ---------------- Memory-Mapped Artifact ----------------
+# Both classes only ever read from mmap'd files, so pages are shared through
+# the OS page cache by every process and never copied on write after fork.
+class MappedChunks:
+    def __init__(self, store_path, offsets_path):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        with open(store_path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return json.loads(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_chunk_store(chunks, store_path, offsets_path):
+    offsets = [0]
+    with open(store_path, "wb") as f:
+        for chunk in chunks:
+            line = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(offsets_path, np.array(offsets, dtype="int64"))
+
+
+# Exact flat search (same results as IndexFlatIP / IndexFlatL2) over a
+# read-only memory-mapped vector matrix.
+class MappedIndex:
+    def __init__(self, vectors_path, metric=METRIC):
+        self.vectors = np.load(vectors_path, mmap_mode="r")
+        self.metric = metric
+        self.ntotal, self.d = self.vectors.shape
+
+    def search(self, queries, k):
+        scores = queries @ self.vectors.T
+        if self.metric == "l2":
+            scores = (queries ** 2).sum(axis=1, keepdims=True) - 2 * scores + (self.vectors ** 2).sum(axis=1)
+            order = scores
+        else:
+            order = -scores
+        top = min(k, self.ntotal)
+        I = np.argpartition(order, top - 1, axis=1)[:, :top]
+        I = np.take_along_axis(I, np.argsort(np.take_along_axis(order, I, axis=1), axis=1), axis=1)
+        D = np.take_along_axis(scores, I, axis=1).astype("float32")
+        if top < k:
+            D = np.pad(D, ((0, 0), (0, k - top)), constant_values=-np.inf if self.metric == "ip" else np.inf)
+            I = np.pad(I, ((0, 0), (0, k - top)), constant_values=-1)
+        return D, I.astype("int64")
+
+
+# ---------------- Retriever ----------------
+class Retriever:
+    def __init__(self, data_dir=DATA_DIR, memory_file=MEMORY_FILE,
+                 model_path=EMBED_MODEL_PATH, index_dir=None, metric=METRIC,
+                 backend=EMBED_BACKEND, embed_model=None):
+        self.data_dir = data_dir
+        self.memory_file = memory_file
+        self.model_path = model_path
+        self.index_dir = index_dir or os.path.join(INDEX_DIR, backend)
+        self.metric = metric
+        self.backend = backend
+        # Several retrievers (e.g. one per tenant) can share one loaded model.
+        self.embed_model = embed_model
+        self.index = None
+        self.chunks = []
+        self.read_only = False
+        self.artifact_path = None   # version directory the index was loaded from or saved to
+        self.lock = threading.Lock()
+
+    @property
+    def documents(self):
+        return [chunk["text"] for chunk in self.chunks]
+
+    def manifest(self):
+        return {
+            "fingerprint": corpus_fingerprint(self.data_dir, self.memory_file),
+            "model": os.path.basename(os.path.normpath(self.model_path)),
+            # torch, onnx and onnx-int8 give slightly different vectors; queries
+            # must be embedded the way the corpus was.
+            "backend": self.backend,
+            "metric": self.metric,
+            "normalized": True,
+        }
+
+    def load_model(self):
+        if self.embed_model is None and self.backend.startswith("onnx"):
+            from onnx_embedder import OnnxEmbedder
+            print(f"[INFO] Loading {self.backend} embedding model...")
+            self.embed_model = OnnxEmbedder(self.model_path, quantized=self.backend == "onnx-int8", threads=ONNX_THREADS)
+        elif self.embed_model is None:
+            SentenceTransformer = import_sentence_transformers()
+            print("[INFO] Loading embedding model...")
+            with timed("load embedding model"):
+                self.embed_model = SentenceTransformer(self.model_path)
+        return self.embed_model
+
+    def warm(self):
+        self.load_model()
+        return self
+
+    def encode(self, texts):
+        vectors = self.load_model().encode(texts, normalize_embeddings=True)
+        return np.ascontiguousarray(vectors, dtype="float32")
+
+    # Builds started here parse in-process unless the caller passes workers:
+    # a pool must only be started from a script's guarded __main__.
+    def load(self, rebuild=False, mapped=False, workers=1):
+        manifest = self.manifest()
+        if mapped:
+            # Workers never build: concurrent rebuilds would race on the artifact.
+            if rebuild or not self.load_artifact(manifest, mapped=True):
+                raise RuntimeError(f"No fresh index artifact in {self.index_dir}; run `python retrieval.py` first")
+            print(f"[INFO] Memory-mapped prebuilt index with {len(self.chunks)} chunks.")
+        elif not rebuild and self.load_artifact(manifest):
+            print(f"[INFO] Loaded prebuilt index with {len(self.chunks)} chunks.")
+        else:
+            self.build(manifest, workers)
+        return self
+
+    # The live version directory, or None before the first save. Resolved
+    # once per load so every file comes from the same version.
+    def current_artifact(self):
+        try:
+            with open(os.path.join(self.index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.index_dir, version)
+        return path if version and os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+    def is_fresh(self):
+        path = self.current_artifact()
+        if path is None:
+            return False
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f) == self.manifest()
+
+    def load_artifact(self, manifest, mapped=False):
+        path = self.current_artifact()
+        if path is None:
+            return False
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            if json.load(f) != manifest:
+                print("[INFO] Index artifact is stale, rebuilding...")
+                return False
+        chunks = MappedChunks(os.path.join(path, CHUNKS_FILE), os.path.join(path, OFFSETS_FILE))
+        with timed("read index"):
+            if mapped:
+                self.chunks = chunks
+                self.index = MappedIndex(os.path.join(path, VECTORS_FILE), self.metric)
+                self.read_only = True
+            else:
+                self.chunks = list(chunks)
+                self.index = import_faiss().read_index(os.path.join(path, INDEX_FILE))
+        self.artifact_path = path
+        return True
+
+    # Documents are parsed (in worker processes when workers > 1) and embedded
+    # batch by batch as they arrive (see ingest.py). Servers and CLIs build
+    # implicitly at import time or inside requests, where a process pool
+    # would re-run unguarded scripts under spawn or fork a threaded process,
+    # so only the build commands ask for more than one worker.
+    def build(self, manifest=None, workers=1, batch_size=ingest.BATCH_SIZE):
+        print("[INFO] Ingesting documents...")
+        progress = ingest.Progress()
+        memory = [{"source": "memory", "text": line} for line in load_memory(self.memory_file)]
+        chunks = ingest.iter_chunks(self.data_dir, memory, workers, progress)
+        self.chunks, self.index = [], None
+        with timed("embed corpus"):
+            for batch, embeddings in ingest.embed_batches(chunks, self.encode, batch_size, progress):
+                if self.index is None:
+                    self.index = getattr(import_faiss(), INDEX_TYPES[self.metric])(embeddings.shape[1])
+                self.index.add(embeddings)
+                self.chunks += batch
+        progress.done()
+        if self.index is None:
+            self.index = getattr(import_faiss(), INDEX_TYPES[self.metric])(self.encode([""]).shape[1])
+        self.save(manifest)
+
+    # Writes a new version directory and publishes it by replacing the
+    # CURRENT_FILE pointer; the running workers' mapped files stay intact.
+    def save(self, manifest=None):
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        path = os.path.join(self.index_dir, version)
+        os.makedirs(path)
+        import_faiss().write_index(self.index, os.path.join(path, INDEX_FILE))
+        np.save(os.path.join(path, VECTORS_FILE), self.index.reconstruct_n(0, self.index.ntotal))
+        write_chunk_store(self.chunks, os.path.join(path, CHUNKS_FILE), os.path.join(path, OFFSETS_FILE))
+        # The manifest goes last: versions without one are still being written.
+        with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest or self.manifest(), f, indent=2)
+        pointer = os.path.join(self.index_dir, f"{CURRENT_FILE}.{version}.tmp")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.index_dir, CURRENT_FILE))
+        self.artifact_path = path
+        self.prune(version)
+
+    # Deletes all but the newest KEEP_VERSIONS finished versions. Unlinking,
+    # unlike truncating, leaves mappings of the deleted files valid.
+    def prune(self, current):
+        versions = sorted((name for name in os.listdir(self.index_dir)
+                           if name.startswith("v") and os.path.exists(os.path.join(self.index_dir, name, MANIFEST_FILE))),
+                          key=lambda name: os.path.getmtime(os.path.join(self.index_dir, name, MANIFEST_FILE)))
+        for name in versions[:-KEEP_VERSIONS]:
+            if name != current:
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+
+    # query_vec lets callers that already encoded the query (e.g. the intent
+    # router) skip a second forward pass.
+    def search(self, query, k=3, query_vec=None):
+        if query_vec is None:
+            query_vec = self.encode([query])
+        with self.lock:  # remember() may be adding to the index
+            D, I = self.index.search(query_vec, k)
+        return D[0], I[0]
+
+    def hits(self, D, I):
+        return [{"id": int(i), "score": float(d), **self.chunks[i]} for d, i in zip(D, I) if i >= 0]
+
+    def retrieve(self, query, k=3, query_vec=None):
+        return self.hits(*self.search(query, k, query_vec))
+
+    # One encoder forward pass and one index search per batch of queries.
+    def retrieve_batch(self, queries, k=3, batch_size=64):
+        results = []
+        for start in range(0, len(queries), batch_size):
+            query_vecs = self.encode(queries[start:start + batch_size])
+            with self.lock:
+                D, I = self.index.search(query_vecs, k)
+            results.extend(self.hits(d, i) for d, i in zip(D, I))
+        return results
+
+    def retrieve_context(self, query, k=3, query_vec=None):
+        return format_context(self.retrieve(query, k, query_vec))
+
+    # Like retrieve(), but k is chosen from the scores (0 to max_k chunks).
+    def retrieve_adaptive(self, query, max_k=ADAPTIVE_MAX_K, query_vec=None):
+        if self.metric != "ip":
+            return self.retrieve(query, 3, query_vec)  # thresholds are cosine similarities
+        hits = select_hits(self.retrieve(query, max_k, query_vec))
+        metrics.incr(f"retrieval.k.{len(hits)}")
+        return hits
+
+    def remember(self, fact):
+        if self.read_only:
+            raise RuntimeError("Memory-mapped index is read-only; rebuild the artifact to add facts")
+        if not self.memory_file:
+            raise RuntimeError("This index has no memory file")
+        fact = fact.strip()
+        save_memory_line(fact, self.memory_file)
+        vector = self.encode([fact])
+        with self.lock:
+            # Chunk first, so a search never returns an id that has no chunk yet
+            self.chunks.append({"source": "memory", "text": fact})
+            self.index.add(vector)
+            self.save()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_retriever():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Retriever().load(mapped=MMAP_INDEX)
+        return _shared
+
+
+if __name__ == "__main__":
+    import sys
+    retriever = Retriever().load(rebuild="--rebuild" in sys.argv, workers=ingest.WORKERS)
+    print(f"[INFO] Index artifact written to {retriever.index_dir}")
@@ -0,0 +1,135 @@
+import time
+import threading
+import metrics
+
+
+# Chunks produced by one generation, shared by every request waiting on it.
+# Each waiter iterates from the first chunk, so requests that join late
+# replay what they missed and then follow the live stream.
+class Flight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.cancel = threading.Event()
+        self.condition = threading.Condition()
+
+    def publish(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    # first_timeout bounds the wait for the first chunk (generation starting),
+    # timeout the wait for the whole reply. A set cancel event ends the stream
+    # early; whoever sets it calls SingleFlight.wake() so a waiter notices
+    # without waiting for the next chunk.
+    def stream(self, timeout=None, first_timeout=None, cancel=None):
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+        first_deadline = now + first_timeout if first_timeout is not None else None
+        position = 0
+        while True:
+            with self.condition:
+                while position == len(self.chunks) and not self.done:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    wait_until = deadline
+                    if not self.chunks and first_deadline is not None:
+                        wait_until = min(wait_until or first_deadline, first_deadline)
+                    remaining = wait_until - time.monotonic() if wait_until is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("generation did not finish in time")
+                    self.condition.wait(remaining)
+                chunks = self.chunks[position:]
+                position = len(self.chunks)
+                done, error = self.done, self.error
+            yield from chunks
+            if cancel is not None and cancel.is_set():
+                return
+            if done and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+# Request coalescing: identical requests that arrive while a generation for
+# the same key is running attach to it instead of starting their own. The
+# producer (a callable taking a cancel Event and returning an iterator of
+# text chunks) runs on its own thread, so every caller, including the first,
+# is just a reader and one caller giving up does not cut the stream short
+# for the others. When the last reader leaves (disconnect or deadline) the
+# cancel event is set and the producer is expected to stop.
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def stream(self, key, producer, timeout=None, first_timeout=None, cancel=None):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+            flight.waiters += 1
+        metrics.incr("coalesce.leader" if leader else "coalesce.joined")
+        if leader:
+            threading.Thread(target=self.run, args=(key, flight, producer), daemon=True).start()
+        return self.follow(key, flight, timeout, first_timeout, cancel)
+
+    def result(self, key, producer, timeout=None, first_timeout=None):
+        return "".join(self.stream(key, producer, timeout, first_timeout))
+
+    def in_flight(self, key):
+        with self.lock:
+            return key in self.flights
+
+    # Wakes every waiting reader so the ones whose cancel event was just set
+    # leave at once (before the first chunk, nothing else would wake them).
+    def wake(self):
+        with self.lock:
+            flights = list(self.flights.values())
+        for flight in flights:
+            with flight.condition:
+                flight.condition.notify_all()
+
+    def follow(self, key, flight, timeout, first_timeout, cancel=None):
+        try:
+            yield from flight.stream(timeout, first_timeout, cancel)
+        finally:
+            with self.lock:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.done:
+                    # Nobody is left to read it: stop the generation and let
+                    # the next identical request start a fresh one.
+                    flight.cancel.set()
+                    if self.flights.get(key) is flight:
+                        del self.flights[key]
+                    metrics.incr("coalesce.abandoned")
+
+    def run(self, key, flight, producer):
+        error = None
+        chunks = None
+        try:
+            chunks = producer(flight.cancel)
+            for chunk in chunks:
+                if flight.cancel.is_set():
+                    break
+                flight.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()  # releases the connection or process behind it
+            # Unregister first: a request arriving after this point starts a
+            # fresh generation rather than reading a finished one.
+            with self.lock:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+            flight.finish(error)
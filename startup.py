@@ -0,0 +1,67 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+timings = {}
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _timings_lock:
+            timings[label] = timings.get(label, 0.0) + elapsed
+
+
+# Runs a loader on a daemon thread so it overlaps with whatever the main
+# thread is doing (usually waiting on input()). get() blocks until done and
+# re-raises any error from the loader.
+class Background:
+    def __init__(self, label, loader):
+        self.label = label
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(loader,), name=f"load-{label}", daemon=True)
+        self.thread.start()
+
+    def run(self, loader):
+        try:
+            with timed(f"load {self.label}"):
+                self.result = loader()
+        except BaseException as e:
+            self.error = e
+
+    def ready(self):
+        return not self.thread.is_alive()
+
+    def get(self):
+        if self.thread.is_alive():
+            with timed(f"wait {self.label}"):
+                self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def report_startup(loaders=()):
+    for loader in loaders:
+        try:
+            loader.get()
+        except Exception as e:
+            print(f"[WARN] {loader.label} failed to load: {e}")
+    total = time.perf_counter() - PROCESS_START
+    print("[INFO] Startup time breakdown (background loads overlap):")
+    for label, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"   {label:<32} {seconds * 1000:9.1f} ms")
+    print(f"   {'wall clock since start':<32} {total * 1000:9.1f} ms")
+
+
+def wants_startup_report():
+    return "--startup-report" in sys.argv
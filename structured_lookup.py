@@ -0,0 +1,292 @@
+import os
+import re
+import sys
+import time
+import retrieval
+
+# ---------------- Config ----------------
+LOOKUP_DIR = os.path.join(retrieval.DATA_DIR, "Graphic Era Hill University")
+FACULTY_FILE = "faculty.txt"
+FEES_FILE = "fees.txt"
+HOSTELS_FILE = "hostels.txt"
+CONTACT_FILE = "contact.txt"
+DEPARTMENTS_FILE = "departments.txt"
+
+# Extra spellings people use for a department; the full name always matches too.
+DEPARTMENT_ALIASES = {
+    "computer science and engineering": ["cse", "computer science", "cs department"],
+    "electronics and communication engineering": ["ece", "electronics"],
+    "mechanical engineering": ["mechanical"],
+    "civil engineering": ["civil"],
+    "computer application": ["computer applications", "bca", "mca"],
+    "management": ["mba", "bba"],
+    "commerce": ["bcom"],
+    "pharmacy": ["pharma", "bpharma"],
+    "allied sciences": ["allied science"],
+}
+
+FEE_WORDS = {"fee", "fees", "cost", "costs", "charge", "charges", "price", "tuition", "deposit"}
+# Words any lookup question may contain. Fee and contact answers are only
+# given when every other word is part of the item asked about, so "late fee
+# for hostel" or "contact the placement cell" fall through to retrieval.
+QUESTION_WORDS = {"what", "whats", "is", "are", "was", "the", "a", "an", "of", "for", "to", "in", "at", "on",
+                  "and", "or", "how", "much", "many", "can", "could", "i", "we", "do", "does", "where", "which",
+                  "please", "give", "me", "tell", "share", "there", "any", "get", "reach", "find", "know",
+                  "about", "it", "its", "with", "by", "from", "s", "your", "you", "u", "gehu", "bhimtal"}
+FEE_QUESTION_WORDS = {"per", "year", "yearly", "annual", "total", "semester", "amount", "structure"}
+CONTACT_QUESTION_WORDS = {"e", "mail", "email", "id", "ids", "website", "site", "url", "web", "page", "working",
+                          "office", "support", "open", "hours", "timings", "address", "pin", "code", "postal",
+                          "located", "location", "phone", "contact", "toll", "free", "helpline", "mobile",
+                          "number", "numbers", "no", "details", "info", "information", "call", "official",
+                          "college", "university", "campus", "graphic", "era", "hill", "admission", "admissions",
+                          "enquiry", "inquiry", "center", "centre"}
+# Whose contact details the question asks for; contact.txt only has the college's.
+CONTACT_ENTITY = re.compile(r"\b(you|your|gehu|graphic era|university|college|campus|admissions?|enquiry|"
+                            r"inquiry|helpline|toll free|office)\b")
+HOD_PATTERN = re.compile(r"\b(hods?|heads?)\b")
+ALL_HODS_PATTERN = re.compile(r"\b(hods|heads? of (the )?departments)\b")
+FACULTY_PATTERN = re.compile(r"\b(faculty|faculties|teachers|professors|staff|lecturers)\b")
+DEPARTMENT_LIST_PATTERN = re.compile(r"\b(departments|schools)\b")
+SPECIALIZATION_PATTERN = re.compile(r"\b(specializations?|specialisations?|programs?|programmes?|courses?)\b")
+CONTACT_PATTERNS = [
+    ("email", re.compile(r"\b(e ?mail|email id|mail)\b")),
+    ("website", re.compile(r"\b(website|site|url|web page)\b")),
+    ("hours", re.compile(r"\b(working hours|office hours|support hours|open hours)\b")),
+    ("address", re.compile(r"\b(address|pin ?code)\b|\b(where is|located|location)\b.*\b(campus|university|college|gehu)\b")),
+    ("phone", re.compile(r"\b(phone|contact|toll free|helpline|mobile)\b")),
+]
+TITLES = {"dr", "mr", "mrs", "ms", "prof"}
+
+
+def normalize(text):
+    text = text.lower().replace("&", " and ").replace(".", "")
+    return " ".join(re.sub(r"[^\w\s₹]", " ", text).split())
+
+
+def contains(text, phrase):
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return [line.rstrip() for line in f]
+
+
+def strip_markdown(text):
+    return re.sub(r"[*`]", "", text).strip()
+
+
+# ---------------- Ingestion ----------------
+def parse_faculty(lines):
+    rows, department = [], None
+    for line in lines:
+        if line.startswith("## "):
+            department = line[3:].strip()
+        elif line.startswith("- ") and department and "—" in line:
+            name, role = [part.strip() for part in line[2:].split("—", 1)]
+            rows.append({"name": name, "role": role, "department": department,
+                         "hod": re.search(r"\bhod\b", role, re.IGNORECASE) is not None})
+    return rows
+
+
+def parse_fees(fee_lines, hostel_lines):
+    rows, category = [], None
+    for line in fee_lines:
+        if line.startswith("## "):
+            category = line[3:].strip()
+        elif line.startswith("- ") and ":" in line:
+            item, amount = [part.strip() for part in line[2:].split(":", 1)]
+            rows.append({"item": item, "amount": amount, "category": category})
+    # hostels.txt keeps fees in a markdown table: | Room | Hostel & Mess | Security | Laundry | Total |
+    header = None
+    for line in hostel_lines:
+        cells = [strip_markdown(cell) for cell in line.strip().strip("|").split("|")]
+        if not line.startswith("|") or set("".join(cells)) <= set("-: "):
+            continue
+        if header is None:
+            header = cells
+            continue
+        parts = ", ".join(f"{name} {value}" for name, value in zip(header[1:-1], cells[1:-1]))
+        rows.append({"item": f"Hostel {cells[0]}", "amount": f"{cells[-1]} ({parts})", "category": "Hostel"})
+    return rows
+
+
+def parse_contacts(lines):
+    rows, section = [], None
+    for line in lines:
+        line = strip_markdown(line)
+        if line.startswith("## "):
+            section = re.sub(r"[^\w\s&-]", "", line[3:]).strip()
+        elif section and line and not line.startswith(("#", "*(")):
+            entry = line[2:].strip() if line.startswith("- ") else line
+            label, _, value = entry.partition(": ")
+            rows.append({"section": section, "label": label if value else "", "value": value or entry})
+    return rows
+
+
+def parse_departments(lines):
+    rows = []
+    for line in lines:
+        if line.startswith("## "):
+            name = re.sub(r"^(school/department|department|school) of\s+", "", line[3:].strip(), flags=re.IGNORECASE)
+            name = re.sub(r"\s*\(.*\)$", "", name)
+            rows.append({"name": name, "heading": line[3:].strip(), "details": []})
+        elif line.startswith("- ") and rows:
+            rows[-1]["details"].append(line[2:].strip())
+    return rows
+
+
+def build_tables(lookup_dir=LOOKUP_DIR):
+    return {
+        "faculty": parse_faculty(read_lines(os.path.join(lookup_dir, FACULTY_FILE))),
+        "fees": parse_fees(read_lines(os.path.join(lookup_dir, FEES_FILE)),
+                           read_lines(os.path.join(lookup_dir, HOSTELS_FILE))),
+        "contacts": parse_contacts(read_lines(os.path.join(lookup_dir, CONTACT_FILE))),
+        "departments": parse_departments(read_lines(os.path.join(lookup_dir, DEPARTMENTS_FILE))),
+    }
+
+
+# ---------------- Query Path ----------------
+# Answers direct lookups ("Who is HOD of CSE?", "Hostel fee?") straight from
+# the parsed tables. answer() returns None whenever it is not confident, and
+# the caller falls through to retrieval + LLM. Plugs into IntentRouter as a
+# handler under the "lookup" intent.
+class StructuredLookup:
+    name = "lookup"
+
+    def __init__(self, lookup_dir=LOOKUP_DIR, tables=None):
+        self.tables = tables or build_tables(lookup_dir)
+        self.index_departments()
+        self.index_people()
+        self.index_fees()
+        self.index_contacts()
+
+    def index_departments(self):
+        self.department_aliases = []
+        names = {row["department"] for row in self.tables["faculty"]}
+        names |= {row["name"] for row in self.tables["departments"]}
+        for name in names:
+            key = normalize(name)
+            for alias in [key] + DEPARTMENT_ALIASES.get(key, []):
+                self.department_aliases.append((alias, key))
+        # Longest alias first so "computer science" wins over "science".
+        self.department_aliases.sort(key=lambda pair: -len(pair[0]))
+
+    def index_people(self):
+        self.people = {}
+        for row in self.tables["faculty"]:
+            tokens = [t for t in normalize(row["name"]).split() if t not in TITLES]
+            if len(tokens) >= 2:
+                self.people.setdefault((tokens[0], tokens[-1]), []).append(row)
+
+    def index_fees(self):
+        self.fee_keys = []
+        self.fee_words = QUESTION_WORDS | FEE_QUESTION_WORDS | FEE_WORDS
+        for row in self.tables["fees"]:
+            tokens = normalize(re.sub(r"[()]", " ", row["item"])).split()
+            self.fee_keys.append((tokens[0], set(tokens[1:]), row))
+            self.fee_words |= set(tokens) | set(normalize(row["category"] or "").split())
+
+    def index_contacts(self):
+        self.contact_labels = {normalize(row["label"]) for row in self.tables["contacts"] if row["label"]}
+        self.contact_words = QUESTION_WORDS | CONTACT_QUESTION_WORDS
+        for row in self.tables["contacts"]:
+            self.contact_words |= set(normalize(row["section"]).split()) | set(normalize(row["label"]).split())
+
+    def find_department(self, text):
+        for alias, key in self.department_aliases:
+            if contains(text, alias):
+                return key
+        return None
+
+    def answer(self, query, query_vec=None):
+        text = normalize(query)
+        if not text:
+            return None
+        for handler in (self.answer_person, self.answer_faculty, self.answer_fees,
+                        self.answer_departments, self.answer_contacts):
+            reply = handler(text)
+            if reply:
+                return reply
+        return None
+
+    def answer_person(self, text):
+        words = set(text.split())
+        matches = [rows for (first, last), rows in self.people.items() if first in words and last in words]
+        if len(matches) != 1:
+            return None
+        rows = matches[0]
+        roles = " and ".join(f"{row['role']} in {row['department']}" for row in rows)
+        return f"{rows[0]['name']} is {roles} at GEHU Bhimtal."
+
+    def answer_faculty(self, text):
+        department = self.find_department(text)
+        rows = [row for row in self.tables["faculty"] if normalize(row["department"]) == department]
+        if (rows and HOD_PATTERN.search(text)) or (not department and ALL_HODS_PATTERN.search(text)):
+            hods = [row for row in (rows or self.tables["faculty"]) if row["hod"]]
+            if not hods:
+                return None
+            return " ".join(f"{row['name']} is the {row['role']} of {row['department']}." for row in hods)
+        if FACULTY_PATTERN.search(text) and rows:
+            names = ", ".join(f"{row['name']} ({row['role']})" for row in rows)
+            return f"{rows[0]['department']} faculty at GEHU Bhimtal: {names}."
+        return None
+
+    def answer_fees(self, text):
+        words = set(text.split())
+        if not words & FEE_WORDS or not words <= self.fee_words:
+            return None
+        scored = []
+        for key, extra, row in self.fee_keys:
+            if key in words:
+                scored.append((len(extra & words), row))
+        if not scored:
+            return None
+        best = max(score for score, _ in scored)
+        rows = [row for score, row in scored if score == best]
+        return " ".join(f"{row['item']}: {row['amount']}." for row in rows)
+
+    def answer_departments(self, text):
+        rows = self.tables["departments"]
+        department = self.find_department(text)
+        if department and SPECIALIZATION_PATTERN.search(text):
+            for row in rows:
+                if normalize(row["name"]) == department:
+                    return f"{row['heading']}: " + " ".join(row["details"])
+        if DEPARTMENT_LIST_PATTERN.search(text) and not department:
+            return "GEHU Bhimtal has these departments and schools: " + ", ".join(row["name"] for row in rows) + "."
+        return None
+
+    def answer_contacts(self, text):
+        if not set(text.split()) <= self.contact_words:
+            return None
+        if not CONTACT_ENTITY.search(text) and not any(contains(text, label) for label in self.contact_labels):
+            return None
+        for category, pattern in CONTACT_PATTERNS:
+            if not pattern.search(text):
+                continue
+            rows = [row for row in self.tables["contacts"] if category in row["section"].lower()
+                    or (category == "phone" and "admission center" in row["section"].lower())]
+            if category == "phone":
+                cities = [row for row in rows if row["label"] and contains(text, row["label"].lower())]
+                rows = cities or [row for row in rows if "phone" in row["section"].lower()]
+            if category == "hours":
+                rows = [row for row in self.tables["contacts"] if "hours" in row["section"].lower()]
+            if rows:
+                return "; ".join(f"{row['label']}: {row['value']}" if row["label"] else row["value"] for row in rows) + "."
+        return None
+
+
+if __name__ == "__main__":
+    tables = build_tables()
+    print("[INFO] " + ", ".join(f"{len(rows)} {name}" for name, rows in tables.items()) + " rows parsed.")
+
+    lookup = StructuredLookup(tables=tables)
+    questions = sys.argv[1:] or ["Who is HOD of CSE?", "Hostel fee?", "What is the BCA fee?",
+                                 "Who is Shilpa Jain?", "What is the admissions phone number?"]
+    for question in questions:
+        start = time.perf_counter()
+        reply = lookup.answer(question)
+        print(f"[{(time.perf_counter() - start) * 1000:.2f} ms] {question} -> {reply}")
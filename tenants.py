@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+import ingest
+import metrics
+import retrieval
+from retrieval import Retriever, select_hits, ADAPTIVE_MAX_K
+
+# Per-campus indexes:
+#   python tenants.py build            # build/refresh index/tenants/<backend>/<tenant>/ for every campus
+#   python tenants.py list
+#
+# Every top-level folder of college_data/ is a tenant, addressed by its slug
+# ("Graphic Era Hill University" -> "graphic-era-hill-university"). A new
+# campus is a new folder; nothing is loaded for it until the first request
+# that names it.
+
+# ---------------- Config ----------------
+TENANT_INDEX_DIR = os.path.join(retrieval.INDEX_DIR, "tenants")
+MEMORY_BUDGET_MB = float(os.environ.get("TENANT_MEMORY_MB", "512"))
+ALL_TENANTS = "*"
+
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def discover_tenants(data_dir=retrieval.DATA_DIR):
+    return {slugify(name): os.path.join(data_dir, name)
+            for name in sorted(os.listdir(data_dir)) if os.path.isdir(os.path.join(data_dir, name))}
+
+
+def index_bytes(retriever):
+    if retriever.read_only:
+        # Mapped artifacts live in the page cache; count what they can occupy.
+        paths = [retrieval.VECTORS_FILE, retrieval.CHUNKS_FILE, retrieval.OFFSETS_FILE]
+        return sum(os.path.getsize(os.path.join(retriever.artifact_path, path)) for path in paths)
+    return retriever.index.ntotal * retriever.index.d * 4 + sum(len(text) for text in retriever.documents)
+
+
+# Loads tenant indexes on first use from their persisted artifacts and keeps
+# the most recently used ones under a memory budget, evicting the least
+# recently used. All tenants share the default retriever's embedding model,
+# so the model is loaded once however many campuses are served.
+class TenantRegistry:
+    def __init__(self, encoder=None, data_dir=retrieval.DATA_DIR, index_dir=TENANT_INDEX_DIR,
+                 budget_mb=MEMORY_BUDGET_MB, mapped=retrieval.MMAP_INDEX):
+        self.encoder = encoder or Retriever()
+        self.paths = discover_tenants(data_dir)
+        self.index_dir = index_dir
+        self.budget = budget_mb * 1024 * 1024
+        self.mapped = mapped
+        self.loaded = OrderedDict()   # tenant -> (retriever, bytes)
+        self.loading = {tenant: threading.Lock() for tenant in self.paths}
+        self.lock = threading.Lock()
+
+    def names(self):
+        return list(self.paths)
+
+    def retriever(self, tenant, embed_model=None):
+        backend = self.encoder.backend
+        return Retriever(data_dir=self.paths[tenant], memory_file=None, backend=backend,
+                         index_dir=os.path.join(self.index_dir, backend, tenant), embed_model=embed_model)
+
+    def get(self, tenant):
+        if tenant not in self.paths:
+            raise KeyError(f"Unknown tenant: {tenant}")
+        with self.lock:
+            if tenant in self.loaded:
+                self.loaded.move_to_end(tenant)
+                return self.loaded[tenant][0]
+        # One loader per tenant; other tenants keep being served meanwhile.
+        with self.loading[tenant]:
+            with self.lock:
+                if tenant in self.loaded:
+                    return self.loaded[tenant][0]
+            retriever = self.retriever(tenant, self.encoder.load_model()).load(mapped=self.mapped)
+            metrics.incr(f"tenant.{tenant}.loads")
+            with self.lock:
+                self.loaded[tenant] = (retriever, index_bytes(retriever))
+                self.evict(keep=tenant)
+            return retriever
+
+    def evict(self, keep):
+        while sum(size for _, size in self.loaded.values()) > self.budget and len(self.loaded) > 1:
+            tenant = next(name for name in self.loaded if name != keep)
+            del self.loaded[tenant]
+            metrics.incr(f"tenant.{tenant}.evictions")
+            print(f"[INFO] Evicted tenant index {tenant} (memory budget {self.budget / 1024 / 1024:.0f} MB)")
+
+    def resolve(self, tenants):
+        if tenants == ALL_TENANTS:
+            return self.names()
+        return [tenants] if isinstance(tenants, str) else list(tenants)
+
+    # Searches one tenant, a list of tenants or ALL_TENANTS and merges the
+    # hits by score. Hit ids are "<tenant>/<chunk id>" so they stay unique.
+    def retrieve(self, query, tenants, k=3, query_vec=None):
+        if query_vec is None:
+            query_vec = self.encoder.encode([query])
+        hits = []
+        for tenant in self.resolve(tenants):
+            for hit in self.get(tenant).retrieve(query, k, query_vec):
+                hits.append({**hit, "id": f"{tenant}/{hit['id']}", "tenant": tenant})
+        hits.sort(key=lambda hit: -hit["score"])
+        return hits[:k]
+
+    def retrieve_adaptive(self, query, tenants, max_k=ADAPTIVE_MAX_K, query_vec=None):
+        hits = select_hits(self.retrieve(query, tenants, max_k, query_vec))
+        metrics.incr(f"retrieval.k.{len(hits)}")
+        return hits
+
+    def status(self):
+        with self.lock:
+            return {"tenants": self.names(), "loaded": {name: size for name, (_, size) in self.loaded.items()},
+                    "budget": self.budget}
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    registry = TenantRegistry(budget_mb=0)
+    if command == "build":
+        for name in registry.names():
+            if registry.retriever(name).is_fresh():
+                print(f"[INFO] {name}: up to date")
+                continue
+            print(f"[INFO] {name}: building")
+            registry.retriever(name, registry.encoder.load_model()).load(rebuild=True, workers=ingest.WORKERS)
+    elif command == "list":
+        for name, path in registry.paths.items():
+            print(f"{name:<32} {path}")
+    else:
+        print("Usage: python tenants.py [build | list]")
@@ -2,15 +2,11 @@ import os
 import subprocess
 import time
 import matplotlib.pyplot as plt
-from sentence_transformers import SentenceTransformer
-import faiss
+from retrieval import get_retriever
 
 # Config
-DATA_DIR = "college_data"
-MEMORY_FILE = "memory.txt"
-EMBED_MODEL_PATH = "./embedding_models/all-MiniLM-L6-v2"
 OLLAMA_MODEL = "llama3.2"
-CPP_EXECUTABLE = "llama.cpp/build/bin/llama-run"
+CPP_EXECUTABLE = os.environ.get("LLAMA_RUN", "llama.cpp/build/bin/llama-run")
 CPP_MODEL_PATH = "models/Llama-3.2-3B-Instruct-Q4_K_M.gguf"
 MAX_TOKENS = 200
 
@@ -24,33 +20,11 @@ queries = [
     "Does GEHU Bhimtal offer scholarships?"
 ]
 
-# Load documents and build index
-def load_documents():
-    docs = []
-    for root, _, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith(".txt"):
-                with open(os.path.join(root, file), 'r', encoding='utf-8', errors='ignore') as f:
-                    text = f.read()
-                    docs.extend([chunk.strip() for chunk in text.split("\n\n") if chunk.strip()])
-    return docs
-
-def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f if line.strip()]
-    return []
-
-embed_model = SentenceTransformer(EMBED_MODEL_PATH)
-documents = load_documents() + load_memory()
-embeddings = embed_model.encode(documents, normalize_embeddings=True)
-index = faiss.IndexFlatIP(embeddings.shape[1])
-index.add(embeddings)
+# Load the shared index
+retriever = get_retriever()
 
 def retrieve_context(query, k=3):
-    vec = embed_model.encode([query], normalize_embeddings=True)
-    D, I = index.search(vec, k)
-    return "\n---\n".join([documents[i] for i in I[0]])
+    return retriever.retrieve_context(query, k)
 
 def build_prompt(query, context):
     return f"""You are a helpful college assistant at Graphic Era Hill University, Bhimtal Campus.
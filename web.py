@@ -1,74 +1,58 @@
 import gradio as gr
-import os
-import faiss
 import subprocess
+import os
 import re
-from datetime import datetime
-from sentence_transformers import SentenceTransformer
-
-DATA_DIR = "college_data"
-MEMORY_FILE = "memory.txt"
-LLAMA_RUN = "llama.cpp/build/bin/llama-run"
+import time
+from retrieval import get_retriever, format_context, ADAPTIVE_MAX_K
+from chat_log import ChatLogWriter
+from intent_router import IntentRouter
+from structured_lookup import StructuredLookup
+from faq_bank import FaqBank
+from llm import run_llm_process, generation_options
+from model_router import ModelRouter, SMALL_MODEL_PATH
+from extractive import ExtractiveAnswerer
+from conversation import ConversationStore, summary_options
+
+LLAMA_RUN = os.environ.get("LLAMA_RUN", "llama.cpp/build/bin/llama-run")
 MODEL_PATH = "models/Llama-3.2-3B-Instruct-Q4_K_M.gguf"
-MAX_TOKENS = 200
-HISTORY_DEPTH = 3
-
-embed_model = SentenceTransformer("./embedding_models/all-MiniLM-L6-v2")
-
-def load_documents():
-    docs = []
-    for root, _, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith(".txt"):
-                with open(os.path.join(root, file), "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
-                    chunks = text.split("\n\n")
-                    docs.extend([chunk.strip() for chunk in chunks if chunk.strip()])
-    return docs
-
-def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f if line.strip()]
-    return []
-
-def save_memory_line(line):
-    with open(MEMORY_FILE, "a", encoding="utf-8") as f:
-        f.write(line.strip() + "\n")
-
-documents = load_documents() + load_memory()
-embeddings = embed_model.encode(documents)
-index = faiss.IndexFlatL2(embeddings.shape[1])
-index.add(embeddings)
-
-chat_history = []
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-chat_file_path = f"chats/chat_{timestamp}.txt"
-
-def log_chat_to_file(user, bot):
-    with open(chat_file_path, "a", encoding="utf-8") as f:
-        f.write(f"User: {user}\nBot: {bot}\n\n")
-
-def format_history():
-    return "\n".join([
-        f"User: {h['user']}\nBot: {h['bot']}"
-        for h in chat_history[-HISTORY_DEPTH:]
-    ])
+LLAMA_TIMEOUT = 120
+LLAMA_FIRST_OUTPUT_TIMEOUT = float(os.environ.get("LLAMA_FIRST_OUTPUT_TIMEOUT", "30"))   # llama-run loads the model and reads the prompt before its first token
+SESSION = "local"
+
+retriever = get_retriever()
+router = IntentRouter(retriever.encode, retriever.remember, handlers=[StructuredLookup(), FaqBank(retriever.encode)])
+# Easy lookups use the 1B model when it has been downloaded next to the 3B one
+models = ModelRouter(SMALL_MODEL_PATH if os.path.exists(SMALL_MODEL_PATH) else "", MODEL_PATH)
+# Answers from the retrieved chunks when llama.cpp fails or times out
+extractive = ExtractiveAnswerer(retriever.encode)
+
+chat_log = ChatLogWriter()
+
+def log_chat_to_file(user, bot, **fields):
+    chat_log.log(user, bot, **fields)
 
 ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
 
-def ask_llama(prompt):
-    result = subprocess.run(
-        [LLAMA_RUN, MODEL_PATH, prompt, f"--n-predict={MAX_TOKENS}"],
-        capture_output=True
-    )
+# Returns None when llama.cpp failed; the caller falls back to an extractive answer.
+def ask_llama(prompt, model_path=MODEL_PATH, options=None):
+    options = options or generation_options()
+    try:
+        result = run_llm_process([LLAMA_RUN, model_path, prompt, f"--n-predict={options['max_tokens']}"],
+                                 timeout=LLAMA_TIMEOUT, options=options, first_timeout=LLAMA_FIRST_OUTPUT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        print("[ERROR] llama.cpp call timed out.")
+        return None
     raw_output = result.stdout.decode("utf-8").strip()
-    return ansi_escape.sub("", raw_output) 
+    return ansi_escape.sub("", raw_output) or None
+
+# Older turns are summarized in the background, by the 1B model when present
+def summarize(prompt):
+    return ask_llama(prompt, models.model("small") or MODEL_PATH, summary_options())
+
+conversation = ConversationStore(summarize)
 
-def retrieve_context(query, k=3):
-    query_vec = embed_model.encode([query])
-    D, I = index.search(query_vec, k)
-    return "\n---\n".join([documents[i] for i in I[0]])
+def retrieve_context(query, max_k=ADAPTIVE_MAX_K, query_vec=None):
+    return retriever.retrieve_adaptive(query, max_k, query_vec)
 
 def build_prompt(query, context):
     return f"""You are AlphaMind, the official assistant for Graphic Era Hill University, Bhimtal Campus.
@@ -81,7 +65,7 @@ Your job:
 - Be polite, relevant, and don't assume identity unless taught
 
 Conversation History:
-{format_history()}
+{conversation.history(SESSION)}
 
 Context:
 {context}
@@ -90,23 +74,36 @@ User: {query}
 Answer:"""
 
 def chat(user_input, history):
-    if user_input.lower().startswith(("remember that", "learn that")):
-        fact = user_input.partition("that")[2].strip()
-        if fact:
-            save_memory_line(fact)
-            reply = f"Learned and saved: {fact}"
-        else:
-            reply = "Please provide a fact after 'remember that'"
-        return {"role": "assistant", "content": reply}
-
-    context = retrieve_context(user_input)
-    prompt = build_prompt(user_input, context)
-    response = ask_llama(prompt)
-
-    chat_history.append({"user": user_input, "bot": response})
-    log_chat_to_file(user_input, response)
-
-    return {"role": "assistant", "content": response}
+    start = time.perf_counter()
+    query_vec = retriever.encode([user_input])
+    route = router.route(user_input, query_vec)
+    if route.reply is not None:
+        log_chat_to_file(user_input, route.reply, lang="en",
+                         latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                         intent=route.intent, chunk_ids=[])
+        return {"role": "assistant", "content": route.reply}
+
+    hits = retrieve_context(user_input, query_vec=query_vec)
+    prompt = build_prompt(user_input, format_context(hits))
+    model_route = models.choose(user_input, hits)
+    generation_start = time.perf_counter()
+    response = ask_llama(prompt, models.model(model_route), generation_options(user_input))
+    if response is None:
+        # Neither remembered nor timed as a model answer
+        fallback = "error"
+        response = extractive.answer(query_vec, hits, fallback)
+        content = f"⚡ Quick answer from the college documents:\n\n{response}"
+    else:
+        fallback = None
+        models.record(model_route, time.perf_counter() - generation_start)
+        conversation.add(SESSION, user_input, response)
+        content = response
+
+    log_chat_to_file(user_input, response, lang="en",
+                     latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                     chunk_ids=[hit["id"] for hit in hits], k=len(hits), model=model_route, fallback=fallback)
+
+    return {"role": "assistant", "content": content}
 
 gr.ChatInterface(
     fn=chat,